@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 # Copyright (c) 2011 Walter Bender
 
 # This program is free software; you can redistribute it and/or modify
@@ -11,38 +12,47 @@
 
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk
+from gi.repository import Gtk, GLib
 
 from sugar3.activity import activity
 from sugar3 import profile
 from sugar3.graphics.toolbarbox import ToolbarBox
 from sugar3.activity.widgets import ActivityToolbarButton
 from sugar3.activity.widgets import StopButton
+from sugar3.datastore import datastore
 
-from toolbar_utils import button_factory, label_factory, separator_factory
-from utils import json_load, json_dump, convert_seconds_to_minutes
+from toolbar_utils import button_factory, label_factory, separator_factory, \
+    combo_factory, entry_factory
+from utils import convert_seconds_to_minutes, PhaseTimer
 
-import telepathy
+# The collaboration modules (telepathy, the presence service and the
+# tube classes in chattube.py) are imported when the activity is
+# shared or joined. dbus itself is already loaded by sugar3.activity.
 import dbus
-from dbus.service import signal
-from dbus.gobject_service import ExportedGObject
-from sugar3.presence import presenceservice
-from sugar3.presence.tubeconn import TubeConnection
 
+import os
+import time
 from gettext import gettext as _
 
 from json import load as jload
 from json import dump as jdump
 from StringIO import StringIO
 
-from game import Game
+from assets import Assets
+from board import decode_board_code, decode_board, BoardEncoder
+from game import Game, PATHS, BOARD_SIZES
+from scores import ScoreStore, csv_lines, json_lines
+import protocol
 
 import logging
 _logger = logging.getLogger('cookie-search-activity')
 
+# How often to check for changes to save to the Journal
+AUTOSAVE_SECONDS = 30
 
-SERVICE = 'org.sugarlabs.CookieSearchActivity'
-IFACE = SERVICE
+# Score export formats: file extension, MIME type, line generator
+EXPORTS = {'csv': ('csv', 'text/csv', csv_lines),
+           'jsonl': ('jsonl', 'application/x-ndjson', json_lines)}
 
 
 class SearchActivity(activity.Activity):
@@ -50,13 +60,29 @@ class SearchActivity(activity.Activity):
 
     def __init__(self, handle):
         """ Initialize the toolbars and the game board """
+        self.startup_timer = PhaseTimer()
         try:
             super(SearchActivity, self).__init__(handle)
         except dbus.exceptions.DBusException as e:
             _logger.error(str(e))
+        self.startup_timer.mark('activity')
 
         self.path = activity.get_bundle_path()
-        self.all_scores = []
+        self.scores = ScoreStore()
+        # What was last written to the Journal, so that unchanged
+        # boards and scores are not encoded again
+        self._board_encoder = BoardEncoder()
+        self._scores_text = self._data_dumper(self.scores.dump())
+        self._game = None
+        self.chattube = None
+        self._codec = protocol.BinaryCodec()  # or protocol.JsonCodec()
+        self._sequence = 0  # of the events we send
+        self._last_sequence = {}  # of the events received, by sender
+        self.initiating = None  # sharing (True) or joining (False)
+
+        # Start decoding the artwork while the toolbars are built
+        self._assets = Assets(self.path, PATHS)
+        self._assets.preload()
 
         self.nick = profile.get_nick_name()
         if profile.get_color() is not None:
@@ -66,23 +92,44 @@ class SearchActivity(activity.Activity):
 
         self._setup_toolbars()
         self._setup_dispatch_table()
+        self.startup_timer.mark('toolbars')
 
-        # Create a canvas
+        # Create a canvas; large boards scroll
         canvas = Gtk.DrawingArea()
-        canvas.set_size_request(Gdk.Screen.width(),
-                                Gdk.Screen.height())
-        self.set_canvas(canvas)
+        viewport = Gtk.Viewport()
+        viewport.add(canvas)
+        scrolled_window = Gtk.ScrolledWindow()
+        scrolled_window.set_policy(Gtk.PolicyType.AUTOMATIC,
+                                   Gtk.PolicyType.AUTOMATIC)
+        scrolled_window.add(viewport)
+        self.set_canvas(scrolled_window)
         canvas.show()
+        viewport.show()
+        scrolled_window.show()
         self.show_all()
+        self.startup_timer.mark('canvas')
 
         self._game = Game(canvas, parent=self, path=self.path,
-                          colors=self.colors)
-        self._setup_presence_service()
+                          colors=self.colors, assets=self._assets,
+                          scrolled_window=scrolled_window)
+        self._first_draw_id = canvas.connect_after('draw', self._first_draw_cb)
 
-        if 'dotlist' in self.metadata:
+        # Collaboration is set up when (and if) the activity is shared
+        self.connect('shared', self._shared_cb)
+        self.connect('joined', self._joined_cb)
+
+        if 'board' in self.metadata or 'dotlist' in self.metadata:
             self._restore()
         else:
             self._game.new_game()
+        self.startup_timer.mark('game')
+
+        GLib.timeout_add_seconds(AUTOSAVE_SECONDS, self._autosave_cb)
+
+    def _first_draw_cb(self, canvas, cr):
+        ''' Time to the first drawn board '''
+        canvas.disconnect(self._first_draw_id)
+        self.startup_timer.mark('first draw')
 
     def _setup_toolbars(self):
         """ Setup the toolbars. """
@@ -106,13 +153,61 @@ class SearchActivity(activity.Activity):
             self._write_scores_to_clipboard,
             tooltip=_('Export scores to clipboard'))
 
+        button_factory(
+            'score-csv',
+            activity_button,
+            self._export_scores_cb,
+            cb_arg='csv',
+            tooltip=_('Export scores to the Journal as CSV'))
+
+        button_factory(
+            'score-jsonl',
+            activity_button,
+            self._export_scores_cb,
+            cb_arg='jsonl',
+            tooltip=_('Export scores to the Journal as JSON Lines'))
+
         button_factory(
             'new-game',
             toolbox.toolbar,
             self._new_game_cb,
             tooltip=_('Start a new game.'))
 
-        label_factory(toolbox.toolbar, '', width=300)
+        self._board_size_combo = combo_factory(
+            ['%d × %d' % size for size in BOARD_SIZES],
+            toolbox.toolbar,
+            self._board_size_cb,
+            tooltip=_('Board size'),
+            default='%d × %d' % BOARD_SIZES[0])
+
+        self._no_guess_combo = combo_factory(
+            [_('Any board'), _('No guessing')],
+            toolbox.toolbar,
+            self._no_guess_cb,
+            tooltip=_('Only deal boards that can be solved without guessing'),
+            default=_('Any board'))
+
+        button_factory(
+            'zoom-out',
+            toolbox.toolbar,
+            self._zoom_cb,
+            cb_arg=0.8,
+            tooltip=_('Zoom out'))
+
+        button_factory(
+            'zoom-in',
+            toolbox.toolbar,
+            self._zoom_cb,
+            cb_arg=1.25,
+            tooltip=_('Zoom in'))
+
+        self._board_code_entry = entry_factory(
+            '', toolbox.toolbar,
+            tooltip=_('Board code: type one in to play that board'),
+            max=16)
+        self._board_code_entry.connect('activate', self._board_code_cb)
+
+        self.status = label_factory(toolbox.toolbar, '', width=300)
 
         separator_factory(toolbox.toolbar, True, False)
 
@@ -124,18 +219,86 @@ class SearchActivity(activity.Activity):
         ''' Start a new game. '''
         self._game.new_game()
 
+    def _board_size_cb(self, combo):
+        ''' Start a new game on a board of a different size. '''
+        if self._game is None:
+            return
+        size = BOARD_SIZES[combo.get_active()]
+        if sorted(size) == sorted(self._game.get_board_size()):
+            return
+        self._game.set_board_size(size[0], size[1])
+        self._game.new_game()
+
+    def _no_guess_cb(self, combo):
+        ''' Start a new game when boards that need guessing are turned
+        off or on. '''
+        if self._game is None:
+            return
+        no_guess = combo.get_active() == 1
+        if no_guess == self._game.no_guess:
+            return
+        self._game.no_guess = no_guess
+        self._game.new_game()
+
+    def _set_board_size_combo(self, size):
+        ''' Show the size of a restored or shared board. '''
+        for i, board_size in enumerate(BOARD_SIZES):
+            if sorted(board_size) == sorted(size):
+                self._board_size_combo.set_active(i)
+
+    def _board_code_cb(self, entry):
+        ''' Play the board for a code typed into the toolbar. '''
+        code = entry.get_text()
+        try:
+            seed, width, height, level, no_guess = decode_board_code(code)
+            self._game.play_board_code(code)
+        except ValueError as e:
+            _logger.debug(str(e))
+            self.show_board_code()
+            return
+        self._set_board_size_combo((width, height))
+        self._no_guess_combo.set_active(int(no_guess))
+
+    def show_board_code(self):
+        ''' Show the code for the current board in the toolbar. '''
+        code = self._game.get_board_code()
+        self._board_code_entry.set_text('' if code is None else code)
+
+    def _zoom_cb(self, button, factor):
+        ''' Make the dots bigger or smaller. '''
+        self._game.zoom(factor)
+
+    def _autosave_cb(self):
+        """ Save to the Journal, but only if something has changed """
+        if self._game.get_board().has_changes() or self.scores.dirty:
+            _logger.debug('autosaving')
+            self.save()
+        return True
+
     def write_file(self, file_path):
         """ Write the grid status to the Journal """
-        dot_list = self._game.save_game()
-        self.metadata['dotlist'] = ''
-        for dot in dot_list:
-            self.metadata['dotlist'] += str(dot)
-            if dot_list.index(dot) < len(dot_list) - 1:
-                self.metadata['dotlist'] += ' '
-        self.metadata['all_scores'] = \
-            self._data_dumper(self.all_scores)
+        if self.scores.dirty:
+            self._scores_text = self._data_dumper(self.scores.dump())
+            self.scores.dirty = False
+        self.metadata['scores'] = self._scores_text
+        if 'all_scores' in self.metadata:  # now in scores
+            del self.metadata['all_scores']
+
+        if self._game.is_generating():
+            # The new board has no cookies yet, so keep the last one
+            _logger.debug('not saving a board that is being generated')
+            return
+        self.metadata['board'] = self._board_encoder.encode(
+            self._game.get_board(), self._game.level)
+        # The board replaces what older versions saved
+        for key in ['dotlist', 'current_level']:
+            if key in self.metadata:
+                del self.metadata[key]
         self.metadata['current_gametime'] = self._game._game_time_seconds
-        self.metadata['current_level'] = self._game.level
+        if self._game.get_board_code() is not None:
+            self.metadata['board_code'] = self._game.get_board_code()
+        elif 'board_code' in self.metadata:  # the code of an older game
+            del self.metadata['board_code']
 
     def _data_dumper(self, data):
         io = StringIO()
@@ -153,22 +316,57 @@ class SearchActivity(activity.Activity):
         self._game._game_time = convert_seconds_to_minutes(
             self._game._game_time_seconds)
 
+        if 'board' in self.metadata:
+            try:
+                width, height, level, dot_list = decode_board(
+                    self.metadata['board'])
+            except ValueError as e:
+                _logger.error(str(e))
+                self._game.new_game()
+            else:
+                self._game.level = level
+                self._game.set_board_size(width, height)
+                self._set_board_size_combo((width, height))
+                self._game.restore_game(dot_list, width)
+        else:
+            self._restore_dotlist()
+
+        if 'board_code' in self.metadata:
+            try:
+                seed, width, height, level, no_guess = decode_board_code(
+                    self.metadata['board_code'])
+                self._game.seed = seed
+                self._game.no_guess = no_guess
+                self._no_guess_combo.set_active(int(no_guess))
+            except ValueError as e:
+                _logger.debug(str(e))
+            self.show_board_code()
+
+        # Older versions saved a list of times as all_scores
+        for key in ['scores', 'all_scores']:
+            if key in self.metadata:
+                try:
+                    self.scores.load(self._data_loader(self.metadata[key]))
+                except ValueError as e:
+                    _logger.error(str(e))
+                break
+        if 'scores' in self.metadata and not self.scores.dirty:
+            self._scores_text = self.metadata['scores']
+        _logger.debug('%d games, best %s' % (self.scores.games,
+                                             self.scores.best))
+
+        # The Journal already has this board
+        self._board_encoder.encode(self._game.get_board(), self._game.level)
+
+    def _restore_dotlist(self):
+        """ Restore a game saved by an older version """
         if 'current_level' in self.metadata:
             current_level_metadata = self.metadata['current_level']
             self._game.level = self._data_loader(current_level_metadata)
 
         if 'dotlist' in self.metadata:
-            dot_list = []
-            dots = self.metadata['dotlist'].split()
-            for dot in dots:
-                dot_list.append(int(dot))
-            self._game.restore_game(dot_list)
-
-        if 'all_scores' in self.metadata:
-            self.all_scores = self._data_loader(self.metadata['all_scores'])
-        else:
-            self.all_scores = []
-        _logger.debug(self.all_scores)
+            self._game.restore_game(
+                [int(dot) for dot in self.metadata['dotlist'].split()])
 
     def _data_loader(self, data):
         io = StringIO(data)
@@ -176,24 +374,42 @@ class SearchActivity(activity.Activity):
 
     def _write_scores_to_clipboard(self, button=None):
         ''' SimpleGraph will plot the cululative results '''
-        _logger.debug(self.all_scores)
-        scores = ''
-        for i, s in enumerate(self.all_scores):
-            scores += '%s: %s\n' % (str(i + 1), s)
-        Gtk.Clipboard().set_text(scores)
+        scores = ['%d: %s' % (i + 1, convert_seconds_to_minutes(seconds))
+                  for i, seconds in enumerate(self.scores.wins_history())]
+        Gtk.Clipboard().set_text('\n'.join(scores) + '\n')
+
+    def _export_scores_cb(self, button, kind):
+        ''' Write the score history to a new Journal entry, a line at a
+        time. '''
+        extension, mime_type, lines = EXPORTS[kind]
+        file_path = os.path.join(self.get_activity_root(), 'instance',
+                                 'scores-%d.%s' % (time.time(), extension))
+        with open(file_path, 'w') as fd:
+            for line in lines(self.scores):
+                fd.write(line)
+
+        dsobject = datastore.create()
+        dsobject.metadata['title'] = '%s %s' % (
+            self.metadata['title'], _('scores'))
+        dsobject.metadata['mime_type'] = mime_type
+        dsobject.metadata['icon-color'] = ','.join(self.colors)
+        dsobject.set_file_path(file_path)
+        datastore.write(dsobject, transfer_ownership=True)
+        dsobject.destroy()
+        _logger.debug('exported %d games to %s' % (len(self.scores),
+                                                   file_path))
 
     # Collaboration-related methods
 
     def _setup_presence_service(self):
         """ Setup the Presence Service. """
+        from sugar3.presence import presenceservice
+
         self.pservice = presenceservice.get_instance()
-        self.initiating = None  # sharing (True) or joining (False)
 
         owner = self.pservice.get_owner()
         self.owner = owner
         self._share = ""
-        self.connect('shared', self._shared_cb)
-        self.connect('joined', self._joined_cb)
 
     def _shared_cb(self, activity):
         """ Either set up initial share..."""
@@ -210,6 +426,10 @@ class SearchActivity(activity.Activity):
                 _shared_activity is null in _shared_cb()")
             return
 
+        import telepathy
+        from chattube import SERVICE
+
+        self._setup_presence_service()
         self.initiating = sharer
         self.waiting_for_hand = not sharer
 
@@ -243,13 +463,17 @@ class SearchActivity(activity.Activity):
     def _new_tube_cb(self, tube_id, initiator, tube_type, service, params,
                      state):
         """ Create a new tube. """
+        import telepathy
+        from sugar3.presence.tubeconn import TubeConnection
+        from chattube import ChatTube, SERVICE
+
         _logger.debug('New tube: ID=%d initator=%d type=%d service=%s \
 params=%r state=%d' % (tube_id, initiator, tube_type, service, params, state))
 
         if (tube_type == telepathy.TUBE_TYPE_DBUS and service == SERVICE):
             if state == telepathy.TUBE_STATE_LOCAL_PENDING:
                 self.tubes_chan[
-                    telepathy.CHANNEL_TYPE_TUBES].AcceptDBusTube(id)
+                    telepathy.CHANNEL_TYPE_TUBES].AcceptDBusTube(tube_id)
 
             tube_conn = TubeConnection(
                 self.conn, self.tubes_chan[
@@ -264,63 +488,76 @@ params=%r state=%d' % (tube_id, initiator, tube_type, service, params, state))
         ''' Associate tokens with commands. '''
         self._processing_methods = {
             'n': [self._receive_new_game, 'get a new game grid'],
+            'c': [self._receive_board_code, 'get a new game board code'],
             'p': [self._receive_dot_click, 'get a dot click'],
+            'r': [self._receive_reveal, 'get a revealed region'],
         }
 
-    def event_received_cb(self, event_message):
+    def event_received_cb(self, event_message, sender=None):
         ''' Data from a tube has arrived. '''
         if len(event_message) == 0:
             return
         try:
-            command, payload = event_message.split('|', 2)
-        except ValueError:
-            _logger.debug('Could not split event message %s' % (event_message))
+            command, payload, sequence = protocol.decode(
+                event_message, self._game.get_board().size)
+        except ValueError as e:
+            _logger.debug(str(e))
             return
+        if command not in self._processing_methods:
+            _logger.debug('Unknown command %s' % (command))
+            return
+        if sequence is not None:  # older versions do not number events
+            last = self._last_sequence.get(sender)
+            if last is not None and sequence <= last:
+                _logger.debug('dropping event %d from %s, after %d' %
+                              (sequence, sender, last))
+                return
+            if last is not None and sequence > last + 1:
+                _logger.debug('missed %d events from %s' %
+                              (sequence - last - 1, sender))
+            self._last_sequence[sender] = sequence
         self._processing_methods[command][0](payload)
 
     def send_new_game(self):
-        ''' Send a new grid to all players '''
-        self.send_event('n|%s' % (json_dump(self._game.save_game())))
+        ''' Send the code for a new board to all players '''
+        self.send_event('c', self._game.get_board_code())
 
-    def _receive_new_game(self, payload):
-        ''' Sharer can start a new game. '''
-        dot_list = json_load(payload)
-        self._game.restore_game(dot_list)
+    def _receive_board_code(self, payload):
+        ''' Everyone builds the board for the code they are sent. '''
+        try:
+            seed, width, height, level, no_guess = decode_board_code(
+                payload)
+            self._game.play_board_code(payload, share=False)
+        except ValueError as e:
+            _logger.debug(str(e))
+            return
+        self._set_board_size_combo((width, height))
+        self._no_guess_combo.set_active(int(no_guess))
 
-    def send_dot_click(self, dot, color):
-        ''' Send a dot click to all the players '''
-        self.send_event('p|%s' % (json_dump([dot, color])))
+    def _receive_new_game(self, payload):
+        ''' Older versions send the whole grid for a new game. '''
+        self._game.restore_game(payload)
 
     def _receive_dot_click(self, payload):
         ''' When a dot is clicked, everyone should change its color. '''
-        (dot, color) = json_load(payload)
+        try:
+            (dot, color) = payload
+        except (TypeError, ValueError):
+            _logger.debug('Not a dot click: %r' % (payload,))
+            return
         self._game.remote_button_press(dot, color)
 
-    def send_event(self, entry):
-        """ Send event through the tube. """
-        if hasattr(self, 'chattube') and self.chattube is not None:
-            self.chattube.SendText(entry)
-
-
-class ChatTube(ExportedGObject):
-    """ Class for setting up tube for sharing """
+    def send_reveal(self, dots):
+        ''' Send a revealed region to all the players '''
+        self.send_event('r', dots)
 
-    def __init__(self, tube, is_initiator, stack_received_cb):
-        super(ChatTube, self).__init__(tube, PATH)
-        self.tube = tube
-        self.is_initiator = is_initiator  # Are we sharing or joining activity?
-        self.stack_received_cb = stack_received_cb
-        self.stack = ''
+    def _receive_reveal(self, payload):
+        ''' Everyone should reveal the same region. '''
+        self._game.remote_reveal(payload)
 
-        self.tube.add_signal_receiver(self.send_stack_cb, 'SendText', IFACE,
-                                      path=PATH, sender_keyword='sender')
-
-    def send_stack_cb(self, text, sender=None):
-        if sender == self.tube.get_unique_name():
-            return
-        self.stack = text
-        self.stack_received_cb(text)
-
-    @signal(dbus_interface=IFACE, signature='s')
-    def SendText(self, text):
-        self.stack = text
+    def send_event(self, command, payload):
+        """ Send event through the tube. """
+        if self.chattube is not None:
+            self._sequence += 1
+            self.chattube.SendText(
+                self._codec.encode(command, payload, self._sequence))
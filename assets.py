@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011-13 Walter Bender
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+from gi.repository import GdkPixbuf, Gdk
+import cairo
+import os
+import threading
+
+import logging
+_logger = logging.getLogger('cookie-search-activity')
+
+
+class Assets():
+    ''' Decode each image once and share its scaled surfaces '''
+
+    def __init__(self, path, names):
+        self._path = path
+        self._names = [name for name in names if name]
+        self._pixbufs = {}  # full-size images, by name
+        self._surfaces = {}  # scaled images, by (name, size)
+        self._lock = threading.Lock()
+
+    def preload(self):
+        ''' Decode the images in a background thread '''
+        thread = threading.Thread(target=self._preload_thread)
+        thread.daemon = True
+        thread.start()
+
+    def _preload_thread(self):
+        for name in self._names:
+            try:
+                self._load(name)
+            except Exception as e:
+                _logger.error('Could not load %s: %s' % (name, e))
+
+    def _load(self, name):
+        ''' Return the full-size pixbuf, decoding it if needed '''
+        with self._lock:
+            if name not in self._pixbufs:
+                _logger.debug('decoding %s' % (name))
+                self._pixbufs[name] = GdkPixbuf.Pixbuf.new_from_file(
+                    os.path.join(self._path, name))
+            return self._pixbufs[name]
+
+    def get_surface(self, name, size):
+        ''' Return the image scaled to fit a size x size surface. The
+        surface is shared, so it must not be drawn on. '''
+        if (name, size) not in self._surfaces:
+            pixbuf = self._load(name)
+            scale = min(float(size) / pixbuf.get_width(),
+                        float(size) / pixbuf.get_height())
+            pixbuf = pixbuf.scale_simple(
+                max(1, int(pixbuf.get_width() * scale)),
+                max(1, int(pixbuf.get_height() * scale)),
+                GdkPixbuf.InterpType.BILINEAR)
+            surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, size, size)
+            context = cairo.Context(surface)
+            Gdk.cairo_set_source_pixbuf(context, pixbuf, 0, 0)
+            context.rectangle(0, 0, size, size)
+            context.fill()
+            self._surfaces[(name, size)] = surface
+        return self._surfaces[(name, size)]
+
+    def clear_surfaces(self):
+        ''' Forget the scaled surfaces, e.g., when the dot size changes '''
+        self._surfaces = {}
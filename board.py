@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011-13 Walter Bender
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+'''
+board.py is the game model for Cookie Search. It has no GTK
+dependencies, so boards can be generated, played and checked on a
+headless machine.
+
+Each cell is stored as one byte in a compact array:
+
+  0  revealed by the player
+  1  hidden, no cookie
+  2  hidden cookie
+  3  no cookie, marked by the player
+  4  cookie, marked by the player
+
+The number of cookies surrounding each cell is kept up to date in a
+second array, so labelling a revealed cell is a lookup rather than a
+walk over its neighbors. The board also keeps a running total of the
+cells in each state, so checking for the end of the game is a lookup.
+
+A board can be described by a short code, such as 3F9K2QA-10x7-2:
+the seed, the size (long side first) and the level. Boards that can
+be solved without guessing (see solver.py) end in -N. The cookies are
+placed with PortableRandom, so the same code makes the same board
+on every machine and every version of Python.
+
+A BoardEncoder packs a board for the Journal. After a header (format
+version, width, height and level), the board is stored as two planes:
+what the player sees of each cell (revealed, hidden or marked) in 2
+bits, then whether it holds a cookie in 1 bit. The result is base64
+text, about 3/8 of a byte per cell. The encoder keeps the planes
+between saves and only repacks the cells that have changed.
+'''
+
+import base64
+import binascii
+import struct
+from array import array
+from collections import deque
+from random import Random
+
+REVEALED = 0
+HIDDEN = 1
+COOKIE = 2
+MARKED = 3
+MARKED_COOKIE = 4
+
+COOKIES = (COOKIE, MARKED_COOKIE)
+
+# Letters used for the seed in board codes (Crockford's base 32)
+CODE_DIGITS = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# The Journal format: version, width, height, level
+BOARD_FORMAT = 1
+_HEADER = struct.Struct('>BHHH')
+# What the player sees of each state, and whether it holds a cookie
+_VIEWS = (0, 1, 1, 2, 2)
+_HAS_COOKIE = (0, 0, 1, 0, 1)
+# The state for each view, less its cookie
+_STATES = (REVEALED, HIDDEN, MARKED)
+
+# Neighbor tables are shared by every board of the same size
+_neighbor_tables = {}
+
+
+def neighbor_table(width, height):
+    ''' Return a tuple listing the cells surrounding each cell of a
+    width x height grid. Each table is only built once. '''
+    if (width, height) not in _neighbor_tables:
+        table = []
+        for y in range(height):
+            for x in range(width):
+                neighbors = []
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        if dx == 0 and dy == 0:
+                            continue
+                        if 0 <= x + dx < width and 0 <= y + dy < height:
+                            neighbors.append(x + dx + (y + dy) * width)
+                table.append(tuple(neighbors))
+        _neighbor_tables[(width, height)] = tuple(table)
+    return _neighbor_tables[(width, height)]
+
+
+class PortableRandom():
+    ''' A 32-bit xorshift generator. Unlike random.Random, it gives
+    the same numbers for a seed on Python 2 and Python 3. '''
+
+    def __init__(self, seed=0):
+        # xorshift gets stuck at 0, and small seeds need a few rounds
+        # before they look random
+        self._state = (seed & 0xFFFFFFFF) or 0x9E3779B9
+        for i in range(8):
+            self._next()
+
+    def _next(self):
+        x = self._state
+        x ^= (x << 13) & 0xFFFFFFFF
+        x ^= x >> 17
+        x ^= (x << 5) & 0xFFFFFFFF
+        self._state = x
+        return x
+
+    def randrange(self, start, stop):
+        ''' Return a number from start up to (but not including) stop '''
+        n = stop - start
+        if n <= 0:
+            raise ValueError('empty range for randrange()')
+        limit = 0x100000000 - 0x100000000 % n  # avoid a bias to low numbers
+        x = self._next()
+        while x >= limit:
+            x = self._next()
+        return start + x % n
+
+
+def encode_board_code(seed, width, height, level, no_guess=False):
+    ''' Return a short code for a board, e.g., 3F9K2QA-10x7-2 '''
+    digits = ''
+    seed &= 0xFFFFFFFF
+    while True:
+        seed, digit = divmod(seed, 32)
+        digits = CODE_DIGITS[digit] + digits
+        if seed == 0:
+            break
+    code = '%s-%dx%d-%d' % (digits, max(width, height), min(width, height),
+                            level)
+    if no_guess:
+        code += '-N'
+    return code
+
+
+def decode_board_code(code):
+    ''' Return the (seed, width, height, level, no_guess) in a board
+    code. Raise ValueError if the code cannot be read. '''
+    fields = code.strip().upper().split('-')
+    no_guess = len(fields) == 4 and fields[3] == 'N'
+    if no_guess:
+        fields = fields[:3]
+    try:
+        digits, size, level = fields
+        width, height = [int(n) for n in size.split('X')]
+        level = int(level)
+    except ValueError:
+        raise ValueError('Not a board code: %s' % (code))
+    # Letters that are easy to mistype
+    digits = digits.replace('O', '0').replace('I', '1').replace('L', '1')
+    if len(digits) == 0 or len(digits) > 7 or width < 1 or height < 1 \
+            or level < 1:
+        raise ValueError('Not a board code: %s' % (code))
+    seed = 0
+    for digit in digits:
+        if digit not in CODE_DIGITS:
+            raise ValueError('Not a board code: %s' % (code))
+        seed = seed * 32 + CODE_DIGITS.index(digit)
+    if seed > 0xFFFFFFFF:
+        raise ValueError('Not a board code: %s' % (code))
+    return seed, width, height, level, no_guess
+
+
+class Board():
+    ''' The state of every cell in a grid_width x grid_height board '''
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self._neighbors = neighbor_table(width, height)
+        self.states = array('b', [HIDDEN]) * self.size
+        self.counts = array('b', [0]) * self.size
+        self.totals = [0, self.size, 0, 0, 0]  # cells in each state
+        self._changes = set()  # cells changed since take_changes
+        self._changed_all = True
+
+    def clear(self):
+        ''' Hide every cell and remove the cookies. Return the cells
+        that changed. '''
+        changed = [i for i in range(self.size) if self.states[i] != HIDDEN]
+        self.states = array('b', [HIDDEN]) * self.size
+        self.counts = array('b', [0]) * self.size
+        self.totals = [0, self.size, 0, 0, 0]
+        self._changes.update(changed)
+        return changed
+
+    def has_changes(self):
+        ''' Has any cell changed since take_changes was last called? '''
+        return self._changed_all or len(self._changes) > 0
+
+    def take_changes(self):
+        ''' Return the cells that changed since the last call, or None
+        if any of them might have. '''
+        if self._changed_all:
+            changes = None
+        else:
+            changes = self._changes
+        self._changes = set()
+        self._changed_all = False
+        return changes
+
+    def place_cookies(self, number, rng=None, exclude=()):
+        ''' Hide number cookies in the hidden cells of the board, other
+        than those in exclude. Pass a seeded PortableRandom as rng to get
+        the same board again. Return the cells with cookies. '''
+        if rng is None:
+            rng = PortableRandom(Random().getrandbits(32))
+        # A partial Fisher-Yates shuffle: each cookie takes one draw,
+        # however full the board is.
+        cells = [i for i in range(self.size)
+                 if self.states[i] == HIDDEN and i not in exclude]
+        number = min(number, len(cells))
+        for i in range(number):
+            j = rng.randrange(i, len(cells))
+            cells[i], cells[j] = cells[j], cells[i]
+            self.set(cells[i], COOKIE)
+        return cells[:number]
+
+    def restore(self, dot_list):
+        ''' Load cell states from a list, e.g., from the Journal '''
+        self.states = array('b', dot_list[:self.size])
+        if len(self.states) < self.size:
+            self.states.extend([HIDDEN] * (self.size - len(self.states)))
+        self.counts = array('b', [0]) * self.size
+        self.totals = [self.states.count(state) for state in range(5)]
+        for i in range(self.size):
+            if self.states[i] in COOKIES:
+                for j in self.neighbors(i):
+                    self.counts[j] += 1
+        self._changed_all = True
+
+    def save(self):
+        ''' Return the cell states as a list '''
+        return self.states.tolist()
+
+    def get(self, i):
+        ''' Return the state of cell i '''
+        return self.states[i]
+
+    def set(self, i, state):
+        ''' Set the state of cell i. Return True if it changed. '''
+        old = self.states[i]
+        if old == state:
+            return False
+        self.states[i] = state
+        self.totals[old] -= 1
+        self.totals[state] += 1
+        self._changes.add(i)
+        if (old in COOKIES) != (state in COOKIES):
+            if state in COOKIES:
+                delta = 1
+            else:
+                delta = -1
+            for j in self.neighbors(i):
+                self.counts[j] += delta
+        return True
+
+    def is_cookie(self, i):
+        ''' Is there a cookie (marked or not) in cell i? '''
+        return self.states[i] in COOKIES
+
+    def count(self, i):
+        ''' Return the number of cookies surrounding cell i '''
+        return self.counts[i]
+
+    def neighbors(self, i):
+        ''' Return the cells surrounding cell i '''
+        return self._neighbors[i]
+
+    def reveal(self, i):
+        ''' Reveal cell i, spreading out from cells with no surrounding
+        cookies. Return the cells that changed. '''
+        if self.states[i] not in (HIDDEN, MARKED):
+            return []
+        self.totals[self.states[i]] -= 1
+        self.states[i] = REVEALED
+        changed = [i]
+        queue = deque(changed)
+        while queue:
+            j = queue.popleft()
+            if self.counts[j] > 0:
+                continue
+            for k in self._neighbors[j]:
+                if self.states[k] in (HIDDEN, MARKED):
+                    self.totals[self.states[k]] -= 1
+                    self.states[k] = REVEALED
+                    changed.append(k)
+                    queue.append(k)
+        self.totals[REVEALED] += len(changed)
+        self._changes.update(changed)
+        return changed
+
+    def reveal_cells(self, cells):
+        ''' Reveal a list of cells, e.g., from a share. Return the cells
+        that changed. '''
+        changed = []
+        for i in cells:
+            if self.set(i, REVEALED):
+                changed.append(i)
+        return changed
+
+    def flip(self, i):
+        ''' Mark or unmark a hidden cell '''
+        old = self.states[i]
+        if old in (HIDDEN, COOKIE):
+            self.states[i] += 2
+        elif old in (MARKED, MARKED_COOKIE):
+            self.states[i] -= 2
+        self.totals[old] -= 1
+        self.totals[self.states[i]] += 1
+        self._changes.add(i)
+
+    def is_game_over(self):
+        ''' The game is over when every cell is either revealed or
+        marked. '''
+        return self.totals[HIDDEN] == 0 and self.totals[COOKIE] == 0
+
+    def grid_to_dot(self, pos):
+        ''' calculate the dot index from a column and row in the grid '''
+        return pos[0] + pos[1] * self.width
+
+    def dot_to_grid(self, dot):
+        ''' calculate the grid column and row for a dot '''
+        return [dot % self.width, int(dot / self.width)]
+
+
+class BoardEncoder():
+    ''' Pack boards for the Journal. The packed cells are kept between
+    saves, so only the cells that changed since the last save are
+    packed again, and nothing at all if none did. '''
+
+    def __init__(self):
+        self._board = None
+        self._level = None
+        self._views = None
+        self._cookies = None
+        self._text = None
+
+    def encode(self, board, level):
+        ''' Return the board and level as text for the Journal '''
+        changes = board.take_changes()
+        if board is not self._board or changes is None:
+            self._board = board
+            self._views = bytearray((board.size + 3) // 4)
+            self._cookies = bytearray((board.size + 7) // 8)
+            changes = range(board.size)
+        elif not changes and level == self._level:
+            return self._text
+        views = self._views
+        cookies = self._cookies
+        for i in changes:
+            state = board.states[i]
+            shift = (i & 3) << 1
+            views[i >> 2] = (views[i >> 2] & ~(3 << shift)) \
+                | (_VIEWS[state] << shift)
+            shift = i & 7
+            cookies[i >> 3] = (cookies[i >> 3] & ~(1 << shift)) \
+                | (_HAS_COOKIE[state] << shift)
+        data = _HEADER.pack(BOARD_FORMAT, board.width, board.height, level) \
+            + bytes(views) + bytes(cookies)
+        self._level = level
+        self._text = base64.b64encode(data).decode('ascii')
+        return self._text
+
+
+def decode_board(text):
+    ''' Return the (width, height, level, states) packed by a
+    BoardEncoder. Raise ValueError if the text cannot be read. '''
+    try:
+        data = bytearray(base64.b64decode(text))
+        version, width, height, level = _HEADER.unpack_from(bytes(data))
+    except (TypeError, ValueError, binascii.Error, struct.error):
+        raise ValueError('Not a saved board')
+    if version != BOARD_FORMAT:
+        raise ValueError('Unknown board format %d' % (version))
+    size = width * height
+    views = _HEADER.size
+    cookies = views + (size + 3) // 4
+    if len(data) != cookies + (size + 7) // 8:
+        raise ValueError('Saved board is %d bytes long' % (len(data)))
+    states = []
+    for i in range(size):
+        view = (data[views + (i >> 2)] >> ((i & 3) << 1)) & 3
+        cookie = (data[cookies + (i >> 3)] >> (i & 7)) & 1
+        if view > 2 or (view == 0 and cookie):
+            raise ValueError('Bad cell %d in saved board' % (i))
+        states.append(_STATES[view] + cookie)
+    return width, height, level, states
@@ -12,8 +12,8 @@
 
 from gi.repository import Gtk, GLib, GdkPixbuf, Gdk
 import cairo
-import os
-from random import uniform
+import threading
+from random import Random
 
 from gettext import gettext as _
 
@@ -23,7 +23,12 @@ from sugar3.graphics.alert import Alert
 from sugar3.graphics.icon import Icon
 from sugar3.graphics import style
 
-from sprites import Sprites, Sprite
+from assets import Assets
+from sprites import Sprites, Sprite, pixel_mask
+from board import Board, PortableRandom, encode_board_code, \
+    decode_board_code, REVEALED, COOKIE, MARKED_COOKIE
+from solver import no_guess_board, no_guess_start, max_no_guess_cookies
+from scores import WON, LOST
 from utils import convert_seconds_to_minutes
 
 _logger = logging.getLogger('cookie-search-activity')
@@ -33,25 +38,47 @@ GRID_CELL_SIZE = style.GRID_CELL_SIZE
 TEN = 10
 SEVEN = 7
 DOT_SIZE = 40
+# Larger boards scroll rather than shrink the dots below this size
+MIN_DOT_SIZE = 30
+MIN_ZOOM = 0.25
+MAX_ZOOM = 4.
+# Board sizes (columns, rows) offered in the toolbar
+BOARD_SIZES = [(TEN, SEVEN), (20, 14), (40, 28), (100, 70), (200, 200)]
 PATHS = [False, 'turtle-monster.jpg', 'cookie.jpg', 'cookie.jpg',
          'bitten-cookie.jpg']
+# The color (and so the image) used for each board cell state
+SHAPES = [0, 1, 1, 2, 2]
 
 
 class Game():
 
     def __init__(self, canvas, parent=None, path=None,
-                 colors=['#A0FFA0', '#FF8080']):
+                 colors=['#A0FFA0', '#FF8080'], assets=None,
+                 scrolled_window=None):
         self._canvas = canvas
+        self._scrolled_window = scrolled_window
         self._parent = parent
         self._parent.show_all()
         self._path = path
         self.level = 1
+        self.seed = None  # the seed used to place the cookies
+        self.no_guess = False  # only deal boards that need no guessing
+        self._generation = 0  # bumped when the board is cleared
+        self._generating = False
 
-        self._colors = ['#FFFFFF']
-        self._colors.append(colors[0])
-        self._colors.append(colors[1])
-        self._colors.append(colors[0])
-        self._colors.append('#FF0000')
+        if assets is None:
+            assets = Assets(self._path, PATHS)
+            assets.preload()
+        self._assets = assets
+
+        # Rendered dots are cached by (color, path, size)
+        self._dot_cache = {}
+        self._dot_cache_size = None
+        self._hit_masks = {}  # where the cookie is, by id of dot surface
+        self.dot_cache_hits = 0
+        self.dot_cache_misses = 0
+
+        self._set_colors(colors)
 
         self._canvas.add_events(Gdk.EventMask.BUTTON_PRESS_MASK)
         self._canvas.connect("draw", self.__draw_cb)
@@ -59,19 +86,10 @@ class Game():
 
         self._width = Gdk.Screen.width()
         self._height = Gdk.Screen.height() - GRID_CELL_SIZE
-        if self._width < self._height:
-            self.portrait = True
-            self.grid_height = TEN
-            self.grid.width = SEVEN
-        else:
-            self.portrait = False
-            self.grid_height = SEVEN
-            self.grid_width = TEN
-        self._scale = min(self._width / (self.grid_width * DOT_SIZE * 1.2),
-                          self._height / (self.grid_height * DOT_SIZE * 1.2))
-
-        self._dot_size = int(DOT_SIZE * self._scale)
-        self._space = int(self._dot_size / 5.)
+        self.portrait = self._width < self._height
+        self._board_size = (TEN, SEVEN)
+        self._set_grid_dimensions()
+        self._zoom = 1.
         self.we_are_sharing = False
 
         # '-1' Workaround for showing 'second 0'
@@ -80,208 +98,455 @@ class Game():
 
         self._timeout_id = None
 
-        # Generate the sprites we'll need...
-        self._sprites = Sprites(self._canvas)
-        self._dots = []
-        for y in range(self.grid_height):
-            for x in range(self.grid_width):
-                xoffset = int((self._width - self.grid_width * self._dot_size
-                               - (self.grid_width - 1) * self._space) / 2.)
-                self._dots.append(
-                    Sprite(self._sprites,
-                           xoffset + x * (self._dot_size + self._space),
-                           y * (self._dot_size + self._space),
-                           self._new_dot(self._colors[0])))
-                self._dots[-1].type = 0  # not set
-                self._dots[-1].set_label_attributes(40)
+        self._board = Board(self.grid_width, self.grid_height)
 
+        # Only the dots in view have sprites; they are recycled as
+        # the board scrolls
+        self._sprites = Sprites(self._canvas)
+        self._dots = {}  # sprites by dot index
+        self._spare_dots = []
+        self._face = None  # label for the revealed dots at game end
+        self._bitten = None  # the cookie that ended the game
+
+        if self._scrolled_window is not None:
+            for adjustment in [self._scrolled_window.get_hadjustment(),
+                               self._scrolled_window.get_vadjustment()]:
+                adjustment.connect('value-changed', self._viewport_changed_cb)
+                adjustment.connect('changed', self._viewport_changed_cb)
+
+        self._layout()
         self._all_clear()
 
         Gdk.Screen.get_default().connect('size-changed', self._configure_cb)
 
     def _configure_cb(self, event):
         dot_list = self.save_game()
+        width = self.grid_width
+        seed = self.seed
 
         self._width = Gdk.Screen.width()
         self._height = Gdk.Screen.height() - GRID_CELL_SIZE
+        self.portrait = self._width < self._height
+        self._set_grid_dimensions()
+
+        self._board = Board(self.grid_width, self.grid_height)
+        self._layout()
+        if self._generating:
+            # The cookies are copied onto the new board when the search
+            # for them is done
+            return
+        self.restore_game(dot_list, width)
+        self.seed = seed
+
+    def _set_grid_dimensions(self):
+        ''' Put the long side of the board along the long side of the
+        screen. '''
+        if self.portrait:
+            self.grid_width = min(self._board_size)
+            self.grid_height = max(self._board_size)
+        else:
+            self.grid_width = max(self._board_size)
+            self.grid_height = min(self._board_size)
+
+    def set_board_size(self, width, height):
+        ''' Change the size of the board. The caller should then start
+        or restore a game. '''
+        if sorted((width, height)) == sorted(self._board_size):
+            return
+        self._board_size = (width, height)
+        self._set_grid_dimensions()
+        for dot in self._dots.values():
+            dot.hide()
+            self._spare_dots.append(dot)
+        self._dots = {}
+        self._board = Board(self.grid_width, self.grid_height)
+        self._layout()
+
+    def get_board_size(self):
+        ''' Return the size of the board as (columns, rows) '''
+        return (self.grid_width, self.grid_height)
+
+    def zoom(self, factor):
+        ''' Make the dots bigger (factor > 1) or smaller '''
+        self._zoom = min(max(self._zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        self._layout()
+
+    def _layout(self):
+        ''' Size the dots to fit the screen (unless they would be too
+        small), then size the canvas to fit the board. '''
+        self._scale = min(self._width / (self.grid_width * DOT_SIZE * 1.2),
+                          self._height / (self.grid_height * DOT_SIZE * 1.2))
+        self._dot_size = int(max(DOT_SIZE * self._scale, MIN_DOT_SIZE)
+                             * self._zoom)
+        self._space = int(self._dot_size / 5.)
 
-        if self._width < self._height:
-            self.portrait = True
-            self.grid_height = TEN
-            self.grid_width = SEVEN
+        step = self._dot_size + self._space
+        board_width = self.grid_width * step - self._space
+        board_height = self.grid_height * step - self._space
+        self._xoffset = max(0, int((self._width - board_width) / 2.))
+        self._canvas.set_size_request(max(self._width, board_width),
+                                      board_height)
+
+        # Only keep an offscreen copy of boards that fit on the screen
+        self._sprites.set_retained(board_width <= self._width
+                                   and board_height <= self._height)
+        self._sprites.enable_spatial_index(step)
+
+        with self._sprites.batch():
+            for i, dot in self._dots.items():
+                dot.move(self._dot_to_xy(i))
+                self._update_dot(i)
+        self._show_visible_dots()
+
+    def _dot_to_xy(self, i):
+        ''' Return the position of a dot on the canvas '''
+        x, y = self._board.dot_to_grid(i)
+        return (self._xoffset + x * (self._dot_size + self._space),
+                y * (self._dot_size + self._space))
+
+    def _viewport(self):
+        ''' Return the visible part of the canvas as (x0, y0, x1, y1) '''
+        if self._scrolled_window is not None:
+            h = self._scrolled_window.get_hadjustment()
+            v = self._scrolled_window.get_vadjustment()
+            if h.get_page_size() > 0 and v.get_page_size() > 0:
+                return (int(h.get_value()), int(v.get_value()),
+                        int(h.get_value() + h.get_page_size()),
+                        int(v.get_value() + v.get_page_size()))
+        return (0, 0, self._width, self._height)
+
+    def _viewport_changed_cb(self, adjustment):
+        self._show_visible_dots()
+
+    def _show_visible_dots(self):
+        ''' Give sprites to the dots in (or next to) the viewport,
+        taking them from the dots that have scrolled out of view. '''
+        x0, y0, x1, y1 = self._viewport()
+        step = self._dot_size + self._space
+        columns = range(max(0, (x0 - self._xoffset) // step - 1),
+                        min(self.grid_width,
+                            (x1 - self._xoffset) // step + 2))
+        rows = range(max(0, y0 // step - 1),
+                     min(self.grid_height, y1 // step + 2))
+        visible = set([self._board.grid_to_dot((x, y))
+                       for y in rows for x in columns])
+        with self._sprites.batch():
+            for i in list(self._dots.keys()):
+                if i not in visible:
+                    self._dots[i].hide()
+                    self._spare_dots.append(self._dots.pop(i))
+            for i in visible:
+                if i not in self._dots:
+                    self._show_dot(i)
+
+    def _show_dot(self, i):
+        ''' Give dot i a sprite, reusing a spare one if there is one '''
+        x, y = self._dot_to_xy(i)
+        if len(self._spare_dots) > 0:
+            dot = self._spare_dots.pop()
+            dot.move((x, y))
+            dot.restore()
         else:
-            self.portrait = False
-            self.grid_height = SEVEN
-            self.grid_width = TEN
-
-        i = 0
-        for y in range(self.grid_height):
-            for x in range(self.grid_width):
-                xoffset = int((self._width - self.grid_width * self._dot_size
-                               - (self.grid_width - 1) * self._space) / 2.)
-                self._dots[i].move(
-                    (xoffset + x * (self._dot_size + self._space),
-                     y * (self._dot_size + self._space)))
-                i += 1
-
-        self.restore_game(dot_list)
+            dot = Sprite(self._sprites, x, y, self._new_dot(self._colors[0]))
+            dot.set_label_attributes(40)
+        dot.index = i
+        self._dots[i] = dot
+        self._update_dot(i)
+
+    def _set_colors(self, colors):
+        ''' Set the (profile) colors used for the dots '''
+        self._colors = ['#FFFFFF']
+        self._colors.append(colors[0])
+        self._colors.append(colors[1])
+        self._colors.append(colors[0])
+        self._colors.append('#FF0000')
+        self._dot_cache = {}
+        self._hit_masks = {}
 
     def __draw_cb(self, canvas, cr):
         self._sprites.redraw_sprites(cr=cr)
+        _logger.debug('drew %d sprites; %d areas merged into %d regions' %
+                      (self._sprites.sprites_drawn,
+                       self._sprites.rects_invalidated,
+                       self._sprites.regions_queued))
+
+    def _update_dot(self, i):
+        ''' Set the shape and label of a dot from the board state '''
+        dot = self._dots.get(i)
+        if dot is None:  # not in view
+            return
+        state = self._board.get(i)
+        if i == self._bitten:
+            dot.set_shape(self._new_dot(self._colors[4]))
+        else:
+            dot.set_shape(self._new_dot(self._colors[SHAPES[state]]))
+        if state != REVEALED:
+            dot.set_label('')
+        elif self._face is not None:
+            dot.set_label(self._face)
+        elif self._board.count(i) > 0:
+            dot.set_label(str(self._board.count(i)))
+        else:
+            dot.set_label('')
+
+    def _update_dots(self, dots):
+        ''' Set the shape and label of dots from the board state '''
+        with self._sprites.batch():
+            for i in dots:
+                self._update_dot(i)
 
     def _all_clear(self):
         ''' Things to reinitialize when starting up a new game. '''
-        for dot in self._dots:
-            if dot.type != 1:
-                dot.type = 1
-                dot.set_shape(self._new_dot(self._colors[dot.type]))
-            dot.set_label('')
+        self._generation += 1
+        self._generating = False
+        self._face = None
+        self._bitten = None
+        self._update_dots(self._board.clear())
         self._stop_timer()
 
-    def new_game(self):
-        ''' Start a new game. '''
+    def _cookies(self, level, size=None):
+        ''' How many cookies to hide at a level. Larger boards get
+        more cookies, so that they are as hard as the standard one. '''
+        if size is None:
+            size = self._board.size
+        return max(level, level * size // (TEN * SEVEN))
+
+    def _max_cookies(self, size, no_guess):
+        ''' The most cookies a board of size (columns, rows) can hold '''
+        if no_guess:
+            return max_no_guess_cookies(max(size), min(size))
+        return size[0] * size[1] - 1
+
+    def new_game(self, seed=None, share=True):
+        ''' Start a new game. Games started with the same seed, board
+        size and level hide the same cookies. Unless share is False,
+        the game is sent to the other players. '''
         self._all_clear()
 
-        # Fill in a few dots to start
-        for i in range(self.level):
-            n = int(uniform(0, self.grid_width * self.grid_height))
-            while True:
-                if self._dots[n].type == 1:
-                    self._dots[n].type = 2
-                    self._dots[n].set_shape(self._new_dot(self._colors[1]))
-                    break
-                else:
-                    n = int(uniform(0, self.grid_width * self.grid_height))
-
-        if self.we_are_sharing:
+        if seed is None:
+            seed = Random().getrandbits(32)
+        self.seed = seed
+
+        # Cookies are placed as if the board were in landscape, so a
+        # board code makes the same board on any screen
+        width = max(self.grid_width, self.grid_height)
+        height = min(self.grid_width, self.grid_height)
+        # Boards without guessing hold fewer cookies, so the level may
+        # have to come down when they are turned on
+        while self.level > 1 and self._cookies(self.level) > \
+                self._max_cookies((width, height), self.no_guess):
+            self.level -= 1
+        number = self._cookies(self.level)
+        if not self.no_guess:
+            landscape = Board(width, height)
+            landscape.place_cookies(number, PortableRandom(seed))
+            self._board_ready(self._generation, landscape, None, share)
+            return
+
+        # Searching for a board can take a while on a large board, so
+        # it is done in a thread; clicks are ignored until it is ready
+        self._generating = True
+        thread = threading.Thread(
+            target=self._generate_thread,
+            args=(self._generation, seed, width, height, number, share))
+        thread.daemon = True
+        thread.start()
+
+    def _generate_thread(self, generation, seed, width, height, number,
+                         share):
+        ''' Look for a board that can be solved without guessing from
+        its center. '''
+        start = no_guess_start(width, height)
+        try:
+            landscape, solved = no_guess_board(width, height, number,
+                                               PortableRandom(seed), start)
+        except Exception as e:  # e.g., the solver revealed a cookie
+            _logger.error('no_guess_board failed for seed %d: %s' % (seed, e))
+            landscape, solved = Board(width, height), False
+            landscape.place_cookies(number, PortableRandom(seed),
+                                    exclude=(start,))
+        if not solved:
+            _logger.debug('no board without guessing for seed %d' % (seed))
+        GLib.idle_add(self._board_ready, generation, landscape, start, share)
+
+    def _board_ready(self, generation, landscape, start, share):
+        ''' Copy the cookies from a landscape board onto our own, reveal
+        the start, and begin the game. '''
+        if generation != self._generation:
+            return False  # the board was cleared while we waited
+        self._generating = False
+
+        for i in range(landscape.size):
+            if landscape.is_cookie(i):
+                self._board.set(self._from_landscape(i), COOKIE)
+        if start is not None:
+            self._update_dots(self._board.reveal(self._from_landscape(start)))
+        self._parent.show_board_code()
+        _logger.debug('dot cache: %d hits, %d misses' %
+                      (self.dot_cache_hits, self.dot_cache_misses))
+
+        if self.we_are_sharing and share:
             _logger.debug('sending a new game')
             self._parent.send_new_game()
 
         self._start_timer()
-
-    def restore_game(self, dot_list):
-        ''' Restore a game from the Journal or share '''
-        for i, dot in enumerate(dot_list):
-            self._dots[i].type = dot
-            if dot in [4]:  # marked by user
-                self._dots[i].set_shape(self._new_dot(self._colors[2]))
-            elif dot in [1, 2]:  # unmarked
-                self._dots[i].set_shape(self._new_dot(self._colors[1]))
-            else:  # revealed by user
-                self._dots[i].set_shape(self._new_dot(self._colors[0]))
-        for i, dot in enumerate(dot_list):
-            if dot == 0:  # label with count
-                count = self._count([2, 4], self._dots[i])
-                if count > 0:
-                    self._dots[i].set_label(count)
+        return False
+
+    def _from_landscape(self, i):
+        ''' Return the cell of our board that matches cell i of the
+        board in landscape. Board codes and shares number the cells in
+        landscape, so they match on any screen. '''
+        if self.grid_width >= self.grid_height:
+            return i
+        x, y = i % self.grid_height, i // self.grid_height
+        return self._board.grid_to_dot((y, x))
+
+    def _to_landscape(self, i):
+        ''' Return the cell of the board in landscape that matches cell
+        i of our board. '''
+        if self.grid_width >= self.grid_height:
+            return i
+        x, y = self._board.dot_to_grid(i)
+        return y + x * self.grid_height
+
+    def get_board_code(self):
+        ''' Return the code for the current board, or None if the board
+        was not made from a seed. '''
+        if self.seed is None:
+            return None
+        return encode_board_code(self.seed, self.grid_width,
+                                 self.grid_height, self.level, self.no_guess)
+
+    def play_board_code(self, code, share=True):
+        ''' Start the game described by a board code. Raise ValueError
+        if the code is not valid. '''
+        seed, width, height, level, no_guess = decode_board_code(code)
+        # Only the sizes in the toolbar can be played, so a code from
+        # another player cannot ask for a board too big to build
+        if sorted((width, height)) not in [sorted(size)
+                                           for size in BOARD_SIZES]:
+            raise ValueError('No board of that size: %s' % (code))
+        if self._cookies(level, width * height) > \
+                self._max_cookies((width, height), no_guess):
+            raise ValueError('Too many cookies for the board: %s' % (code))
+        self.set_board_size(width, height)
+        self.level = level
+        self.no_guess = no_guess
+        self.new_game(seed, share)
+
+    def restore_game(self, dot_list, width=None):
+        ''' Restore a game from the Journal or share. If width is given,
+        it is the number of columns of the board the list was saved
+        from, and the board is turned to fit ours. '''
+        if width is not None and width != self.grid_width:
+            height = len(dot_list) // width
+            dot_list = [dot_list[x + y * width]
+                        for x in range(width) for y in range(height)]
+        self._generation += 1
+        self._generating = False
+        self.seed = None
+        self._parent.show_board_code()
+        self._face = None
+        self._bitten = None
+        self._board.restore(dot_list)
+        self._update_dots(list(self._dots.keys()))
 
         self._counter()
 
+    def is_generating(self):
+        ''' Is a board that needs no guessing still being searched for? '''
+        return self._generating
+
+    def get_board(self):
+        ''' Return the board, e.g., for saving to the Journal '''
+        return self._board
+
     def save_game(self):
         ''' Return dot list for saving to Journal or
         sharing '''
-        dot_list = []
-
-        for dot in self._dots:
-            dot_list.append(dot.type)
-        return dot_list
+        return self._board.save()
 
     def _set_label(self, gametime):
         ''' Set the label in the toolbar or the window frame. '''
         self._parent.status.set_label(_('Level') + ' '
                                       + str(self.level) + ' / ' + gametime)
 
-    def _neighbors(self, spr):
-        ''' Return the list of surrounding dots '''
-        neighbors = []
-        x, y = self._dot_to_grid(self._dots.index(spr))
-        if x > 0 and y > 0:
-            neighbors.append(self._dots[self._grid_to_dot((x - 1, y - 1))])
-        if x > 0:
-            neighbors.append(self._dots[self._grid_to_dot((x - 1, y))])
-        if x > 0 and y < self.grid_height - 1:
-            neighbors.append(self._dots[self._grid_to_dot((x - 1, y + 1))])
-        if y > 0:
-            neighbors.append(self._dots[self._grid_to_dot((x, y - 1))])
-        if y < self.grid_height - 1:
-            neighbors.append(self._dots[self._grid_to_dot((x, y + 1))])
-        if x < self.grid_width - 1 and y > 0:
-            neighbors.append(self._dots[self._grid_to_dot((x + 1, y - 1))])
-        if x < self.grid_width - 1:
-            neighbors.append(self._dots[self._grid_to_dot((x + 1, y))])
-        if x < self.grid_width - 1 and y < self.grid_height - 1:
-            neighbors.append(self._dots[self._grid_to_dot((x + 1, y + 1))])
-        return neighbors
-
-    def _count(self, count_type, spr):
-        ''' Count the number of surrounding dots of type count_type '''
-        counter = 0
-        for dot in self._neighbors(spr):
-            if dot.type in count_type:
-                counter += 1
-        return counter
-
-    def _floodfill(self, old_type, spr):
-        if spr.type not in old_type:
-            return
-
-        spr.type = 0
-        spr.set_shape(self._new_dot(self._colors[spr.type]))
-        if self.we_are_sharing:
-            _logger.debug('sending a click to the share')
-            self._parent.send_dot_click(self._dots.index(spr), spr.type)
-
-        counter = self._count([2, 4], spr)
-        if counter > 0:
-            spr.set_label(str(counter))
-        else:
-            spr.set_label('')
-            for dot in self._neighbors(spr):
-                self._floodfill(old_type, dot)
+    def _floodfill(self, spr):
+        ''' Reveal a dot and spread out to its empty neighbors '''
+        changed = self._board.reveal(spr.index)
+        self._update_dots(changed)
+        if self.we_are_sharing and len(changed) > 0:
+            _logger.debug('sending a reveal to the share')
+            self._parent.send_reveal([self._to_landscape(i)
+                                      for i in changed])
 
     def _button_press_cb(self, win, event):
         win.grab_focus()
         x, y = map(int, event.get_coords())
 
         spr = self._sprites.find_sprite((x, y))
-        if spr is None:
+        if spr is None or self._generating:
             return
+        if self._face is not None:  # the game is over and scored
+            return True
 
+        state = self._board.get(spr.index)
         if event.button > 1:  # right click
-            if spr.type != 0:
+            if state != REVEALED:
                 self._flip_the_cookie(spr)
             return True
         else:
-            if spr.type != 0:
-                red, green, blue, alpha = spr.get_pixel((x, y))
-                if red > 190 and red < 215:  # clicked the cookie
-                    self._flip_the_cookie(spr)
-                    return True
-
-        if spr.type in [2, 4]:
-            spr.set_shape(self._new_dot(self._colors[4]))
+            if state != REVEALED and self._hit_the_cookie(spr, (x, y)):
+                self._flip_the_cookie(spr)
+                return True
+
+        if self._board.is_cookie(spr.index):
+            self._bitten = spr.index
+            self._update_dots([spr.index])
             self._frown()
             return True
 
-        if spr.type is not None:
-            self._floodfill([1, 3], spr)
-            self._test_game_over()
+        self._floodfill(spr)
+        self._test_game_over()
 
         return True
 
+    def _hit_the_cookie(self, spr, pos):
+        ''' Is pos on the cookie in the dot image? '''
+        image = spr.images[0]
+        if id(image) not in self._hit_masks:
+            self._hit_masks[id(image)] = pixel_mask(
+                image, lambda red, green, blue, alpha: 190 < red < 215)
+        x = pos[0] - spr.rect[0]
+        y = pos[1] - spr.rect[1]
+        width = image.get_width()
+        if x < 0 or y < 0 or x > width - 1 or y > image.get_height() - 1:
+            return False
+        return self._hit_masks[id(image)][y * width + x] == 1
+
     def _flip_the_cookie(self, spr):
-        if spr.type in [1, 2]:
-            spr.set_shape(self._new_dot(self._colors[2]))
-            spr.type += 2
-        else:  # elif spr.type in [3, 4]:
-            spr.set_shape(self._new_dot(self._colors[1]))
-            spr.type -= 2
+        self._board.flip(spr.index)
+        self._update_dots([spr.index])
         self._test_game_over()
 
     def remote_button_press(self, dot, color):
         ''' Receive a button press from a sharer '''
-        self._dots[dot].type = color
-        self._dots[dot].set_shape(self._new_dot(self._colors[color]))
+        if not (0 <= dot < self._board.size
+                and REVEALED <= color <= MARKED_COOKIE):
+            _logger.debug('Bad dot click %r %r' % (dot, color))
+            return
+        dot = self._from_landscape(dot)
+        self._board.set(dot, color)
+        self._update_dots([dot])
+
+    def remote_reveal(self, dots):
+        ''' Receive a revealed region from a sharer '''
+        cells = [self._from_landscape(i) for i in dots
+                 if 0 <= i < self._board.size]
+        if len(cells) < len(dots):
+            _logger.debug('%d revealed cells are off the board' %
+                          (len(dots) - len(cells)))
+        self._update_dots(self._board.reveal_cells(cells))
 
     def set_sharing(self, share=True):
         _logger.debug('enabling sharing')
@@ -310,36 +575,36 @@ class Game():
     def _smile(self):
         self._stop_timer()
         self.game_won = True
-        for dot in self._dots:
-            if dot.type == 0:
-                dot.set_label('☻')
+        self._face = '☻'
+        for i, dot in self._dots.items():
+            if self._board.get(i) == REVEALED:
+                dot.set_label(self._face)
         self._new_game_alert()
 
     def _frown(self):
         self._stop_timer()
         self.game_won = False
-        for dot in self._dots:
-            if dot.type == 0:
-                dot.set_label('☹')
+        self._add_score(LOST)
+        self._face = '☹'
+        for i, dot in self._dots.items():
+            if self._board.get(i) == REVEALED:
+                dot.set_label(self._face)
         self._new_game_alert()
 
     def _test_game_over(self):
         ''' Check to see if game is over '''
-        for dot in self._dots:
-            if dot.type == 1 or dot.type == 2:
-                return False
-        self._parent.all_scores.append(self._game_time)
-        _logger.debug(self._parent.all_scores)
+        if not self._board.is_game_over():
+            return False
+        self._add_score(WON)
         self._smile()
         return True
 
-    def _grid_to_dot(self, pos):
-        ''' calculate the dot index from a column and row in the grid '''
-        return pos[0] + pos[1] * self.grid_width
-
-    def _dot_to_grid(self, dot):
-        ''' calculate the grid column and row for a dot '''
-        return [dot % self.grid_width, int(dot / self.grid_width)]
+    def _add_score(self, outcome):
+        width, height = self.get_board_size()
+        self._parent.scores.add(max(self._game_time_seconds, 0), self.level,
+                                width, height, outcome)
+        _logger.debug('%d games, best %s' % (self._parent.scores.games,
+                                             self._parent.scores.best))
 
     def _new_game_alert(self):
         alert = Alert()
@@ -360,7 +625,8 @@ class Game():
         if response_id is Gtk.ResponseType.OK:
             if self.game_won is False:
                 self.level = 1
-            elif self.grid_height * self.grid_width - self.level > 1:
+            elif self._cookies(self.level + 1) <= self._max_cookies(
+                    self.get_board_size(), self.no_guess):
                 self.level += 1
             self.new_game()
 
@@ -382,24 +648,33 @@ class Game():
 
     def _new_dot(self, color):
         ''' generate a dot of a color color '''
-        self._dot_cache = {}
-        if color not in self._dot_cache:
+        if self._dot_cache_size != self._dot_size:
+            self._dot_cache = {}
+            self._hit_masks = {}
+            self._dot_cache_size = self._dot_size
+            self._assets.clear_surfaces()
+        i = self._colors.index(color)
+        key = (color, PATHS[i], self._dot_size)
+        if key in self._dot_cache:
+            self.dot_cache_hits += 1
+        else:
+            self.dot_cache_misses += 1
+            if PATHS[i] is not False:
+                # The JPEG artwork is decoded once and shared
+                self._dot_cache[key] = self._assets.get_surface(
+                    PATHS[i], self._dot_size)
+                return self._dot_cache[key]
+
             self._stroke = color
             self._fill = color
             self._svg_width = self._dot_size
             self._svg_height = self._dot_size
 
-            i = self._colors.index(color)
-            if PATHS[i] is False:
-                pixbuf = svg_str_to_pixbuf(
-                    self._header()
-                    + self._circle(self._dot_size / 2., self._dot_size / 2.,
-                                   self._dot_size / 2.)
-                    + self._footer())
-            else:
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(
-                    os.path.join(self._path, PATHS[i]),
-                    self._svg_width, self._svg_height)
+            pixbuf = svg_str_to_pixbuf(
+                self._header()
+                + self._circle(self._dot_size / 2., self._dot_size / 2.,
+                               self._dot_size / 2.)
+                + self._footer())
 
             surface = cairo.ImageSurface(cairo.FORMAT_ARGB32,
                                          self._svg_width, self._svg_height)
@@ -407,9 +682,9 @@ class Game():
             Gdk.cairo_set_source_pixbuf(context, pixbuf, 0, 0)
             context.rectangle(0, 0, self._svg_width, self._svg_height)
             context.fill()
-            self._dot_cache[color] = surface
+            self._dot_cache[key] = surface
 
-        return self._dot_cache[color]
+        return self._dot_cache[key]
 
     def _line(self, vertical=True):
         ''' Generate a center line '''
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011-13 Walter Bender
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+'''
+protocol.py turns the events shared between players into the text
+sent through the tube, and back again. Each event is a one-letter
+command and its payload:
+
+  c  a board code (see board.py)
+  n  a whole board, as sent by older versions (JSON data)
+  p  a cell and its new state ([dot, state])
+  r  the cells revealed by a click (a list of dots)
+
+The JSON codec sends 'command|payload', as older versions did. The
+binary codec sends '#' and then base64 of
+
+  version, command, sequence number, payload
+
+where numbers are varints (7 bits a byte, low bits first). Revealed
+cells are sorted and sent as runs of consecutive cells, each run as
+the gap since the last one and its length, so a flood fill across the
+board takes a few bytes instead of a number per cell. decode tells the
+codecs apart by the first character, so either can be received. It is
+given the number of cells on the board, and refuses cells past it, so
+a broken message cannot ask for more cells than the board has.
+'''
+
+import base64
+import binascii
+import json
+
+from board import encode_board_code, decode_board_code
+
+BINARY_PREFIX = '#'
+PROTOCOL_VERSION = 1
+
+# Commands whose payloads are text, not JSON, in the JSON codec
+_TEXT_COMMANDS = ('c',)
+
+
+def _pack_varint(data, n):
+    while n > 0x7F:
+        data.append((n & 0x7F) | 0x80)
+        n >>= 7
+    data.append(n)
+
+
+def _unpack_varint(data, offset):
+    ''' Return the varint at offset and the offset after it '''
+    n = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError('Message ends in a number')
+        byte = data[offset]
+        offset += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, offset
+        shift += 7
+
+
+def _pack_runs(data, dots):
+    ''' Pack a list of dots as runs of consecutive dots '''
+    runs = []
+    for dot in sorted(set(dots)):
+        if runs and dot == runs[-1][0] + runs[-1][1]:
+            runs[-1][1] += 1
+        else:
+            runs.append([dot, 1])
+    _pack_varint(data, len(runs))
+    end = 0
+    for start, length in runs:
+        _pack_varint(data, start - end)
+        _pack_varint(data, length)
+        end = start + length
+
+
+def _unpack_runs(data, offset, max_cells):
+    count, offset = _unpack_varint(data, offset)
+    if count > max_cells:
+        raise ValueError('Too many runs of cells: %d' % (count))
+    dots = []
+    end = 0
+    for i in range(count):
+        gap, offset = _unpack_varint(data, offset)
+        length, offset = _unpack_varint(data, offset)
+        if end + gap + length > max_cells:
+            raise ValueError('Cells past the end of the board')
+        dots.extend(range(end + gap, end + gap + length))
+        end += gap + length
+    return dots, offset
+
+
+def _pack_ints(data, numbers):
+    _pack_varint(data, len(numbers))
+    for n in numbers:
+        _pack_varint(data, n)
+
+
+def _unpack_ints(data, offset, max_cells):
+    count, offset = _unpack_varint(data, offset)
+    if count > len(data) - offset:  # each number takes a byte or more
+        raise ValueError('Message ends in a number')
+    numbers = []
+    for i in range(count):
+        n, offset = _unpack_varint(data, offset)
+        numbers.append(n)
+    return numbers, offset
+
+
+def _pack_text(data, text):
+    encoded = bytearray(text.encode('utf-8'))
+    _pack_varint(data, len(encoded))
+    data.extend(encoded)
+
+
+def _unpack_text(data, offset):
+    length, offset = _unpack_varint(data, offset)
+    if offset + length > len(data):
+        raise ValueError('Message ends in text')
+    return bytes(data[offset:offset + length]).decode('utf-8'), \
+        offset + length
+
+
+def _pack_board_code(data, code):
+    ''' Pack the fields of a board code rather than its text '''
+    seed, width, height, level, no_guess = decode_board_code(code)
+    _pack_ints(data, [seed, width, height, level, int(no_guess)])
+
+
+def _unpack_board_code(data, offset, max_cells):
+    fields, offset = _unpack_ints(data, offset, max_cells)
+    if len(fields) != 5:
+        raise ValueError('Not a board code')
+    return encode_board_code(*fields[:4], no_guess=bool(fields[4])), offset
+
+
+def _pack_json(data, payload):
+    _pack_text(data, json.dumps(payload))
+
+
+def _unpack_json(data, offset, max_cells):
+    text, offset = _unpack_text(data, offset)
+    return json.loads(text), offset
+
+
+# How the binary codec packs the payload of each command
+_PACKERS = {
+    'c': (_pack_board_code, _unpack_board_code),
+    'n': (_pack_json, _unpack_json),
+    'p': (_pack_ints, _unpack_ints),
+    'r': (_pack_runs, _unpack_runs),
+}
+
+
+class JsonCodec():
+    ''' The text format used by older versions '''
+
+    def encode(self, command, payload, sequence):
+        ''' Return the text to send for an event. There is no room for
+        the sequence number. '''
+        if command in _TEXT_COMMANDS:
+            return '%s|%s' % (command, payload)
+        return '%s|%s' % (command, json.dumps(payload))
+
+    def decode(self, text, max_cells):
+        ''' Return the (command, payload, sequence) in a message. The
+        sequence is None. Raise ValueError if it cannot be read. The
+        cells are checked by the game, not here. '''
+        try:
+            command, payload = text.split('|', 1)
+        except ValueError:
+            raise ValueError('Could not split event message %s' % (text))
+        if command not in _TEXT_COMMANDS:
+            payload = json.loads(payload)
+        return command, payload, None
+
+
+class BinaryCodec():
+    ''' A compact, versioned format, sent as base64 text '''
+
+    def encode(self, command, payload, sequence):
+        ''' Return the text to send for an event '''
+        data = bytearray([PROTOCOL_VERSION, ord(command)])
+        _pack_varint(data, sequence)
+        _PACKERS[command][0](data, payload)
+        return BINARY_PREFIX + base64.b64encode(bytes(data)).decode('ascii')
+
+    def decode(self, text, max_cells):
+        ''' Return the (command, payload, sequence) in a message for a
+        board of max_cells cells. Raise ValueError if it cannot be
+        read. '''
+        try:
+            data = bytearray(base64.b64decode(text[len(BINARY_PREFIX):]))
+        except (TypeError, binascii.Error):
+            raise ValueError('Could not decode event message %s' % (text))
+        if len(data) < 2:
+            raise ValueError('Event message is too short')
+        if data[0] != PROTOCOL_VERSION:
+            raise ValueError('Unknown protocol version %d' % (data[0]))
+        command = chr(data[1])
+        if command not in _PACKERS:
+            raise ValueError('Unknown command %s' % (command))
+        sequence, offset = _unpack_varint(data, 2)
+        payload, offset = _PACKERS[command][1](data, offset, max_cells)
+        return command, payload, sequence
+
+
+_json_codec = JsonCodec()
+_binary_codec = BinaryCodec()
+
+
+def decode(text, max_cells):
+    ''' Decode a message from either codec, for a board of max_cells
+    cells '''
+    if text.startswith(BINARY_PREFIX):
+        return _binary_codec.decode(text, max_cells)
+    return _json_codec.decode(text, max_cells)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011-13 Walter Bender
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+'''
+scores.py keeps the results of finished games. Only the most recent
+games are kept in full; older ones survive in running totals (the
+best time, the mean time and the games won and lost at each level),
+so the store stays the same size however long the activity is used.
+
+csv_lines and json_lines turn the history into text a line at a time,
+so it can be written to a file without building it all in memory.
+'''
+
+import json
+import time
+
+WON = 'won'
+LOST = 'lost'
+
+# The fields of each game in the history, in order
+FIELDS = ('duration', 'level', 'width', 'height', 'outcome', 'timestamp')
+
+# How many games to keep in full
+MAX_HISTORY = 200
+
+SCORES_FORMAT = 1
+
+
+def _parse_time(text):
+    ''' Convert a time shown as [h:]mm:ss to seconds '''
+    seconds = 0
+    for part in text.split(':'):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+class ScoreStore():
+    ''' The history of finished games, with running totals '''
+
+    def __init__(self, max_history=MAX_HISTORY):
+        self.max_history = max_history
+        self.history = []  # the recent games, oldest first, as FIELDS
+        self.games = 0
+        self.wins = 0
+        self.best = None  # the fastest win, in seconds
+        self._win_time = 0  # seconds spent on all the wins
+        self._levels = {}  # [won, lost] by level
+        self.dirty = False  # changed since it was last saved
+
+    def __len__(self):
+        return len(self.history)
+
+    def add(self, duration, level, width, height, outcome, timestamp=None):
+        ''' Record a finished game. The duration is in seconds. '''
+        if timestamp is None:
+            timestamp = int(time.time())
+        self._count(duration, level, outcome)
+        self.history.append([duration, level, width, height, outcome,
+                             timestamp])
+        if len(self.history) > self.max_history:
+            del self.history[:len(self.history) - self.max_history]
+        self.dirty = True
+
+    def _count(self, duration, level, outcome):
+        self.games += 1
+        if level is not None:
+            won_lost = self._levels.setdefault(level, [0, 0])
+            if outcome == WON:
+                won_lost[0] += 1
+            else:
+                won_lost[1] += 1
+        if outcome == WON:
+            self.wins += 1
+            self._win_time += duration
+            if self.best is None or duration < self.best:
+                self.best = duration
+
+    def mean(self):
+        ''' Return the mean time of the games won, or None '''
+        if self.wins == 0:
+            return None
+        return float(self._win_time) / self.wins
+
+    def histogram(self):
+        ''' Return (level, won, lost) for each level played '''
+        return [(level, won, lost)
+                for level, (won, lost) in sorted(self._levels.items())]
+
+    def wins_history(self):
+        ''' Return the durations of the recent games won '''
+        return [game[0] for game in self.history if game[4] == WON]
+
+    def dump(self):
+        ''' Return the store as data that can be saved as JSON '''
+        return {'version': SCORES_FORMAT,
+                'history': self.history,
+                'games': self.games,
+                'wins': self.wins,
+                'best': self.best,
+                'win_time': self._win_time,
+                'levels': [list(row) for row in self.histogram()]}
+
+    def load(self, data):
+        ''' Load what dump returned, or the list of [h:]mm:ss times
+        saved by older versions. Raise ValueError if it cannot be
+        read. '''
+        self.__init__(self.max_history)
+        if isinstance(data, list):
+            for text in data:
+                try:
+                    duration = _parse_time(text)
+                except (AttributeError, ValueError):
+                    raise ValueError('Not a time: %r' % (text))
+                self._count(duration, None, WON)
+                self.history.append([duration, None, None, None, WON, None])
+            del self.history[:-self.max_history]
+            self.dirty = True
+            return
+        try:
+            version = data['version']
+            history = [list(game) for game in data['history']]
+            levels = dict((level, [won, lost])
+                          for level, won, lost in data['levels'])
+            games, wins = data['games'], data['wins']
+            best, win_time = data['best'], data['win_time']
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Not a score store')
+        if version != SCORES_FORMAT:
+            raise ValueError('Unknown scores format %r' % (version))
+        self.history = history[-self.max_history:]
+        self._levels = levels
+        self.games = games
+        self.wins = wins
+        self.best = best
+        self._win_time = win_time
+
+
+def csv_lines(store):
+    ''' Yield the history as lines of comma-separated values, after a
+    line of field names '''
+    yield ','.join(FIELDS) + '\n'
+    for game in store.history:
+        yield ','.join(['' if value is None else str(value)
+                        for value in game]) + '\n'
+
+
+def json_lines(store):
+    ''' Yield the history as JSON Lines, one object per game '''
+    for game in store.history:
+        yield json.dumps(dict(zip(FIELDS, game)), sort_keys=True) + '\n'
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011-13 Walter Bender
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+'''
+solver.py checks whether a board can be cleared by logic alone, and
+uses that to generate boards that never need a guess. Like board.py,
+it has no GTK dependencies.
+
+The solver plays the way a careful player does. It only looks at the
+numbers on the revealed cells and the number of cookies left, and
+tries these rules in turn, going back to the cheapest one whenever a
+cell is decided:
+
+  count    a number that already touches all its cookies makes its
+           other hidden neighbors safe; one with as many hidden
+           neighbors as missing cookies makes them all cookies
+  subset   if the hidden neighbors of one number are a subset of
+           another's, the cells in the difference hold the difference
+           of the two counts
+  total    if no cookies are left, every hidden cell is safe; if every
+           hidden cell must be a cookie, they all are
+  enumerate
+           every arrangement of cookies in a small group of hidden
+           cells along the edge of the revealed area is tried; a cell
+           that holds a cookie in all (or none) of the arrangements
+           that fit the numbers is decided
+'''
+
+from collections import deque
+
+from board import Board
+
+UNKNOWN = 0
+SAFE = 1
+MINE = 2
+
+# The largest group of edge cells to enumerate, and how many
+# arrangements to try before giving up on it
+MAX_GROUP = 16
+MAX_STEPS = 20000
+
+# How many boards to try before settling for one that needs a guess
+MAX_ATTEMPTS = 100
+
+
+class Solver():
+    ''' Solve a board by logic, knowing only what a player would '''
+
+    def __init__(self, board):
+        self._board = board
+        self._neighbors = [board.neighbors(i) for i in range(board.size)]
+        self._counts = board.counts
+        self._state = [UNKNOWN] * board.size
+        self._unknown = board.size  # cells not yet decided
+        self._cookies_left = sum(1 for i in range(board.size)
+                                 if board.is_cookie(i))
+        self._queue = deque()  # revealed cells to check
+        self._queued = set()
+        self._frontier = set()  # revealed cells with undecided neighbors
+
+    def solve(self, start):
+        ''' Return True if every cell without a cookie can be revealed,
+        starting by revealing start, without having to guess. '''
+        if self._board.is_cookie(start):
+            return False
+        self._reveal(start)
+        while self._unknown > self._cookies_left:
+            if self._propagate():
+                continue
+            if self._subsets() or self._total() or self._enumerate():
+                continue
+            return False
+        return True
+
+    def _check(self, i):
+        if i not in self._queued:
+            self._queued.add(i)
+            self._queue.append(i)
+
+    def _reveal(self, i):
+        ''' Reveal cell i, spreading out from cells with no surrounding
+        cookies, as the game does. '''
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            if self._state[j] != UNKNOWN:
+                continue
+            if self._board.is_cookie(j):  # the rules are wrong
+                raise RuntimeError('solver revealed a cookie at %d' % (j))
+            self._state[j] = SAFE
+            self._unknown -= 1
+            self._check(j)
+            for k in self._neighbors[j]:
+                if self._state[k] == SAFE:
+                    self._check(k)
+                elif self._counts[j] == 0:
+                    stack.append(k)
+
+    def _mark(self, i):
+        ''' Cell i must be a cookie. '''
+        if self._state[i] != UNKNOWN:
+            return
+        self._state[i] = MINE
+        self._unknown -= 1
+        self._cookies_left -= 1
+        for k in self._neighbors[i]:
+            if self._state[k] == SAFE:
+                self._check(k)
+
+    def _constraint(self, i):
+        ''' Return the undecided neighbors of revealed cell i and how
+        many cookies they hold between them. '''
+        unknown = []
+        cookies = self._counts[i]
+        for j in self._neighbors[i]:
+            if self._state[j] == UNKNOWN:
+                unknown.append(j)
+            elif self._state[j] == MINE:
+                cookies -= 1
+        return unknown, cookies
+
+    def _propagate(self):
+        ''' Apply the count rule until nothing changes. Return True if
+        any cell was decided. '''
+        progress = False
+        while self._queue:
+            i = self._queue.popleft()
+            self._queued.discard(i)
+            unknown, cookies = self._constraint(i)
+            if not unknown:
+                self._frontier.discard(i)
+                continue
+            self._frontier.add(i)
+            if cookies == 0:
+                for j in unknown:
+                    self._reveal(j)
+                progress = True
+            elif cookies == len(unknown):
+                for j in unknown:
+                    self._mark(j)
+                progress = True
+        return progress
+
+    def _constraints(self):
+        ''' Return the frontier constraints as (cells, cookies) keyed by
+        the revealed cell. '''
+        constraints = {}
+        for i in self._frontier:
+            unknown, cookies = self._constraint(i)
+            if unknown:
+                constraints[i] = (frozenset(unknown), cookies)
+        return constraints
+
+    def _subsets(self):
+        ''' Apply the subset rule. Return True if any cell was decided. '''
+        constraints = self._constraints()
+        for i, (cells_a, cookies_a) in constraints.items():
+            # Only numbers that share an undecided cell can overlap
+            others = set()
+            for j in cells_a:
+                for k in self._neighbors[j]:
+                    if k != i and k in constraints:
+                        others.add(k)
+            for k in others:
+                cells_b, cookies_b = constraints[k]
+                if len(cells_b) <= len(cells_a) or not cells_a < cells_b:
+                    continue
+                rest = cells_b - cells_a
+                if cookies_b == cookies_a:
+                    for j in rest:
+                        self._reveal(j)
+                    return True
+                if cookies_b - cookies_a == len(rest):
+                    for j in rest:
+                        self._mark(j)
+                    return True
+        return False
+
+    def _total(self):
+        ''' Apply the total rule. Return True if any cell was decided. '''
+        if self._cookies_left == 0:
+            cells = [i for i in range(self._board.size)
+                     if self._state[i] == UNKNOWN]
+            for i in cells:
+                self._reveal(i)
+            return len(cells) > 0
+        if self._cookies_left == self._unknown:
+            for i in range(self._board.size):
+                self._mark(i)
+            return True
+        return False
+
+    def unstick(self, rng):
+        ''' After solve has failed, pick a number on the edge of the
+        revealed area and make its hidden neighbors all cookies or all
+        safe, so that the number can be used. The cells are swapped
+        with undecided cells away from the edge, where that leaves the
+        other numbers unchanged, or else with any undecided cells.
+        If the revealed area is walled in by cookies, one of them is
+        moved instead. Return False if nothing can be changed. '''
+        constraints = self._constraints()
+        edge = set()
+        for cells, cookies in constraints.values():
+            edge.update(cells)
+        # Sorted, so that the same rng makes the same board everywhere
+        undecided = [i for i in range(self._board.size)
+                     if self._state[i] == UNKNOWN]
+        inside = [i for i in undecided if i not in edge]
+        if not constraints:
+            walls = [i for i in range(self._board.size)
+                     if self._state[i] == MINE
+                     and UNKNOWN in [self._state[j]
+                                     for j in self._neighbors[i]]]
+            if not walls:
+                return False
+            wall = walls[rng.randrange(0, len(walls))]
+            return self._swap([wall], inside, rng)
+        for away_from_edge in (True, False):
+            numbers = sorted(constraints)
+            while numbers:
+                i = numbers.pop(rng.randrange(0, len(numbers)))
+                cells = constraints[i][0]
+                if away_from_edge:
+                    others = inside
+                else:
+                    others = [j for j in undecided if j not in cells]
+                if self._swap(sorted(cells), others, rng):
+                    return True
+        return False
+
+    def _swap(self, cells, others, rng):
+        ''' Make cells all cookies or all safe by swapping them with
+        some of others. Return False if there are not enough others. '''
+        options = []
+        for cookie in (True, False):
+            cells_to_swap = [j for j in cells
+                             if self._board.is_cookie(j) != cookie]
+            partners = [k for k in others
+                        if self._board.is_cookie(k) == cookie]
+            if len(cells_to_swap) <= len(partners):
+                options.append((cells_to_swap, partners))
+        if not options:
+            return False
+        cells_to_swap, partners = options[rng.randrange(0, len(options))]
+        for j in cells_to_swap:
+            k = partners.pop(rng.randrange(0, len(partners)))
+            state = self._board.get(j)
+            self._board.set(j, self._board.get(k))
+            self._board.set(k, state)
+        return True
+
+    def _groups(self, constraints):
+        ''' Split the undecided cells along the frontier into groups
+        that do not share a number. '''
+        by_cell = {}
+        for i in sorted(constraints):
+            for j in constraints[i][0]:
+                by_cell.setdefault(j, []).append(i)
+        # Everything is visited in order, so that the search (and any
+        # board made with it) is the same on every version of Python
+        groups = []
+        seen = set()
+        for first in sorted(by_cell):
+            if first in seen:
+                continue
+            # Breadth first, so that each cell tends to share numbers
+            # with the cells just before it, which prunes early
+            group = []
+            seen.add(first)
+            queue = deque([first])
+            while queue:
+                j = queue.popleft()
+                group.append(j)
+                for i in by_cell[j]:
+                    for k in sorted(constraints[i][0]):
+                        if k not in seen:
+                            seen.add(k)
+                            queue.append(k)
+            groups.append(group)
+        return groups, by_cell
+
+    def _enumerate(self):
+        ''' Try every arrangement of cookies in each small group of
+        frontier cells. Return True if any cell was decided. '''
+        constraints = self._constraints()
+        groups, by_cell = self._groups(constraints)
+        # With a single group, the cookies it does not hold must fit
+        # in the cells away from the frontier
+        if len(groups) == 1:
+            interior = self._unknown - len(by_cell)
+        else:
+            interior = None
+        for group in sorted(groups, key=len):
+            if len(group) > MAX_GROUP:
+                break
+            result = self._arrangements(group, constraints, by_cell,
+                                        interior)
+            if result is None:
+                continue
+            always, never = result
+            for j in never:
+                self._reveal(j)
+            for j in always:
+                self._mark(j)
+            if always or never:
+                return True
+        return False
+
+    def _arrangements(self, group, constraints, by_cell, interior):
+        ''' Return the cells of group that hold a cookie in every
+        arrangement that fits the numbers, and those that never do,
+        or None if there are too many arrangements to try. If interior
+        is not None, it is the number of undecided cells outside the
+        group. '''
+        numbers = set()
+        for j in group:
+            numbers.update(by_cell[j])
+        numbers = list(numbers)
+        index = dict((i, n) for n, i in enumerate(numbers))
+        # Cookies each number still needs, and cells it still has open
+        need = [constraints[i][1] for i in numbers]
+        open_cells = [len(constraints[i][0]) for i in numbers]
+        touches = [[index[i] for i in by_cell[j]] for j in group]
+
+        size = len(group)
+        assignment = [0] * size
+        seen_cookie = [False] * size
+        seen_safe = [False] * size
+        self._steps = 0
+
+        def place(n, placed):
+            self._steps += 1
+            if self._steps > MAX_STEPS:
+                return False
+            if placed > self._cookies_left:
+                return True
+            if n == size:
+                if interior is not None \
+                        and self._cookies_left - placed > interior:
+                    return True
+                for k in range(size):
+                    if assignment[k]:
+                        seen_cookie[k] = True
+                    else:
+                        seen_safe[k] = True
+                return True
+            for value in (0, 1):
+                fits = True
+                for c in touches[n]:
+                    open_cells[c] -= 1
+                    need[c] -= value
+                    if need[c] < 0 or need[c] > open_cells[c]:
+                        fits = False
+                if fits:
+                    assignment[n] = value
+                    if not place(n + 1, placed + value):
+                        fits = None
+                for c in touches[n]:
+                    open_cells[c] += 1
+                    need[c] += value
+                if fits is None:
+                    return False
+            return True
+
+        if not place(0, 0):
+            return None
+        always = [group[k] for k in range(size)
+                  if seen_cookie[k] and not seen_safe[k]]
+        never = [group[k] for k in range(size)
+                 if seen_safe[k] and not seen_cookie[k]]
+        return always, never
+
+
+def no_guess_start(width, height):
+    ''' Return the cell that boards are solved from: the middle one '''
+    return width // 2 + (height // 2) * width
+
+
+def max_no_guess_cookies(width, height):
+    ''' Return the most cookies no_guess_board can place. The start and
+    its neighbors never hold cookies, and at least one other cell must
+    be left to find. '''
+    x, y = width // 2, height // 2
+    clear = (min(x + 1, width - 1) - max(x - 1, 0) + 1) \
+        * (min(y + 1, height - 1) - max(y - 1, 0) + 1)
+    return width * height - clear - 1
+
+
+def no_guess_board(width, height, number, rng, start,
+                   attempts=MAX_ATTEMPTS):
+    ''' Return a board with number cookies that can be cleared from
+    start without guessing, and True. The cells around start never
+    hold cookies. If no such board turns up in attempts tries, return
+    the last board tried, or a new one, and False. '''
+    board = None
+    for attempt in range(attempts):
+        if board is None:
+            board = Board(width, height)
+            board.place_cookies(number, rng,
+                                exclude=(start,) + board.neighbors(start))
+        solver = Solver(board)
+        if solver.solve(start):
+            return board, True
+        # Rather than start again, move cookies to or from the cells
+        # where the solver got stuck. Dense boards are rarely solvable
+        # as dealt, but a few moves are usually enough.
+        if not solver.unstick(rng):
+            board = None
+    if board is None:
+        board = Board(width, height)
+        board.place_cookies(number, rng,
+                            exclude=(start,) + board.neighbors(start))
+    return board, False
@@ -78,9 +78,109 @@ def svg_str_to_pixbuf(svg_string):
 
 import gi
 gi.require_version('PangoCairo', '1.0')
-from gi.repository import Gtk, GdkPixbuf, Gdk
+from gi.repository import Gtk, GdkPixbuf, Gdk, GLib
 from gi.repository import Pango, PangoCairo
 import cairo
+import sys
+from array import array
+from bisect import bisect, bisect_left
+from contextlib import contextmanager
+
+# Label attributes are (scale, rescale, horiz_align, vert_align, x_pos,
+# y_pos) tuples. Sprites share identical attribute tuples and font
+# descriptions rather than each keeping their own copies.
+DEFAULT_LABEL_ATTRIBUTES = ((12, True, 'center', 'middle', None, None),)
+NO_MARGINS = (0, 0, 0, 0)
+BLACK = (0., 0., 0.)
+_shared_attributes = {}
+_shared_fonts = {}
+
+# Invalidated areas are merged into at most MAX_REGIONS regions. Two
+# areas are merged when their bounding box is no more than MERGE_SLACK
+# times their combined area, e.g., neighboring dots on a grid.
+MAX_REGIONS = 8
+MERGE_SLACK = 1.25
+
+
+def _share(attributes):
+    ''' Return the shared copy of a label attributes tuple '''
+    return _shared_attributes.setdefault(attributes, attributes)
+
+
+def _area(r):
+    return (r[2] - r[0]) * (r[3] - r[1])
+
+
+def _union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]),
+            max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _add_region(regions, rect):
+    ''' Add an (x0, y0, x1, y1) rectangle to a list of regions, merging
+    it with the regions it (nearly) overlaps. Return the number of
+    merges. '''
+    merged = 0
+    i = 0
+    while i < len(regions):
+        union = _union(regions[i], rect)
+        if _area(union) <= (_area(regions[i]) + _area(rect)) * MERGE_SLACK:
+            del regions[i]
+            rect = union
+            merged += 1
+            i = 0  # the bigger rect may now overlap an earlier region
+        else:
+            i += 1
+    regions.append(rect)
+    while len(regions) > MAX_REGIONS:
+        # Merge the two regions whose bounding box wastes least area
+        best = None
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                waste = _area(_union(regions[i], regions[j])) - \
+                    _area(regions[i]) - _area(regions[j])
+                if best is None or waste < best[0]:
+                    best = (waste, i, j)
+        waste, i, j = best
+        union = _union(regions[i], regions[j])
+        del regions[j]
+        regions[i] = union
+        merged += 1
+    return merged
+
+
+def _get_pixels(image):
+    ''' Return a view of the pixel data of a surface or pixbuf, its
+    stride, the bytes per pixel and where the red, green, blue and
+    alpha bytes are in each pixel. '''
+    if isinstance(image, cairo.ImageSurface):
+        image.flush()
+        # ARGB32 pixels are stored as native-endian 32-bit words
+        if sys.byteorder == 'little':
+            order = (2, 1, 0, 3)
+        else:
+            order = (1, 2, 3, 0)
+        return memoryview(image.get_data()), image.get_stride(), 4, order
+    return memoryview(image.get_pixels()), image.get_rowstride(), \
+        image.get_n_channels(), (0, 1, 2, 3)
+
+
+def pixel_mask(image, test):
+    ''' Return a bytearray with one byte for each pixel of an image,
+    set to 1 where test(r, g, b, a) is True. An image shared by many
+    sprites can then be hit tested without reading its pixels. '''
+    view, stride, channels, order = _get_pixels(image)
+    width = image.get_width()
+    mask = bytearray(width * image.get_height())
+    for y in range(image.get_height()):
+        row = bytearray(view[y * stride:y * stride + width * channels])
+        for x in range(width):
+            pixel = row[x * channels:(x + 1) * channels]
+            if channels == 3:
+                pixel.append(255)
+            if test(*[pixel[j] for j in order]):
+                mask[y * width + x] = 1
+    return mask
 
 
 class Sprites:
@@ -90,12 +190,124 @@ class Sprites:
         ''' Initialize an empty array of sprites '''
         self.cr = None
         self.widget = widget
-        self.list = []
+        self.list = []  # in drawing order, i.e., by (layer, sequence)
+        self._keys = []  # the (layer, sequence) key of each sprite in list
+        self._members = set()
+        self._sequence = 0
+        self._batch_depth = 0
+        self._dirty = []  # regions waiting to be queued for drawing
+        self._flush_id = None
+        self._invalidated = 0
+        self._merged = 0
+        # What the last flush did
+        self.rects_invalidated = 0
+        self.rects_merged = 0
+        self.regions_queued = 0
+        self._cell_size = None
+        self._buckets = {}
+        self._indexed = {}
+        self.sprites_drawn = 0  # in the last call to redraw_sprites
+        self._retained = False
+        self._backing = None
+        self._damage = []
 
     def set_cairo_context(self, cr):
         ''' Cairo context may be set or reset after __init__ '''
         self.cr = cr
 
+    def begin_batch(self):
+        ''' Collect invalidated areas until end_batch is called '''
+        self._batch_depth += 1
+
+    def end_batch(self):
+        ''' Queue the areas invalidated in the batch for redrawing '''
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self._schedule_flush()
+
+    @contextmanager
+    def batch(self):
+        ''' Collect the areas invalidated in a with block '''
+        self.begin_batch()
+        try:
+            yield
+        finally:
+            self.end_batch()
+
+    def _schedule_flush(self):
+        ''' Queue the dirty regions once, before the next frame is
+        drawn '''
+        if self._flush_id is None and len(self._dirty) > 0:
+            self._flush_id = GLib.idle_add(self._flush,
+                                           priority=GLib.PRIORITY_HIGH_IDLE)
+
+    def _flush(self):
+        for x0, y0, x1, y1 in self._dirty:
+            self.widget.queue_draw_area(x0, y0, x1 - x0, y1 - y0)
+        self.rects_invalidated = self._invalidated
+        self.rects_merged = self._merged
+        self.regions_queued = len(self._dirty)
+        self._dirty = []
+        self._flush_id = None
+        self._invalidated = 0
+        self._merged = 0
+        return False
+
+    def set_retained(self, retained=True):
+        ''' In retained mode the sprites are composed on an offscreen
+        surface, and only the invalidated areas of it are redrawn. '''
+        self._retained = retained
+        self._backing = None
+        self._damage = []
+
+    def invalidate(self, rect):
+        ''' Invalidate a region for gtk. Regions are merged and queued
+        for drawing once per frame (or at the end of a batch). '''
+        if rect[2] <= 0 or rect[3] <= 0:
+            return
+        rect = (rect[0], rect[1], rect[0] + rect[2], rect[1] + rect[3])
+        if self._retained:
+            _add_region(self._damage, rect)
+        self._invalidated += 1
+        self._merged += _add_region(self._dirty, rect)
+        if self._batch_depth == 0:
+            self._schedule_flush()
+
+    def enable_spatial_index(self, cell_size):
+        ''' Keep the sprites in a grid of cell_size buckets so that
+        find_sprite only has to test the sprites near a position '''
+        self._cell_size = int(cell_size)
+        self._buckets = {}
+        self._indexed = {}
+        for spr in self.list:
+            self._add_to_index(spr)
+
+    def _add_to_index(self, spr):
+        ''' File a sprite in every bucket it overlaps '''
+        c = self._cell_size
+        x0, y0 = spr.rect[0] // c, spr.rect[1] // c
+        x1 = (spr.rect[0] + spr.rect[2]) // c
+        y1 = (spr.rect[1] + spr.rect[3]) // c
+        keys = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+        for key in keys:
+            if key in self._buckets:
+                self._buckets[key].append(spr)
+            else:
+                self._buckets[key] = [spr]
+        self._indexed[spr] = keys
+
+    def _remove_from_index(self, spr):
+        for key in self._indexed.pop(spr):
+            self._buckets[key].remove(spr)
+            if len(self._buckets[key]) == 0:
+                del self._buckets[key]
+
+    def update_index(self, spr):
+        ''' A sprite has moved or changed size '''
+        if spr in self._indexed:
+            self._remove_from_index(spr)
+            self._add_to_index(spr)
+
     def get_sprite(self, i):
         ''' Return a sprint from the array '''
         if i < 0 or i > len(self.list) - 1:
@@ -108,25 +320,43 @@ class Sprites:
         return(len(self.list))
 
     def append_to_list(self, spr):
-        ''' Append a new sprite to the end of the list. '''
-        self.list.append(spr)
+        ''' Put a sprite on top of the other sprites in its layer. '''
+        self.remove_from_list(spr)
+        self._sequence += 1
+        spr._key = (spr.layer, self._sequence)
+        i = bisect(self._keys, spr._key)
+        self._keys.insert(i, spr._key)
+        self.list.insert(i, spr)
+        self._members.add(spr)
+        if self._cell_size is not None:
+            self._add_to_index(spr)
 
     def insert_in_list(self, spr, i):
-        ''' Insert a sprite at position i. '''
-        if i < 0:
-            self.list.insert(0, spr)
-        elif i > len(self.list) - 1:
-            self.list.append(spr)
-        else:
-            self.list.insert(i, spr)
+        ''' Add a sprite to the list. The list is kept in layer order,
+        so the sprite goes on top of its layer whatever i is. '''
+        self.append_to_list(spr)
 
     def remove_from_list(self, spr):
         ''' Remove a sprite from the list. '''
-        if spr in self.list:
-            self.list.remove(spr)
+        if spr in self._members:
+            i = bisect_left(self._keys, spr._key)
+            del self._keys[i]
+            del self.list[i]
+            self._members.discard(spr)
+        if spr in self._indexed:
+            self._remove_from_index(spr)
 
     def find_sprite(self, pos):
         ''' Search based on (x, y) position. Return the 'top/first' one. '''
+        if self._cell_size is not None:
+            key = (int(pos[0]) // self._cell_size,
+                   int(pos[1]) // self._cell_size)
+            hits = [spr for spr in self._buckets.get(key, []) if spr.hit(pos)]
+            if len(hits) == 0:
+                return None
+            if len(hits) == 1:
+                return hits[0]
+            return max(hits, key=lambda spr: spr._key)
         list = self.list[:]
         list.reverse()
         for spr in list:
@@ -135,7 +365,8 @@ class Sprites:
         return None
 
     def redraw_sprites(self, area=None, cr=None):
-        ''' Redraw the sprites that intersect area. '''
+        ''' Redraw the sprites that intersect area. If no area is
+        given, use the clip region of the Cairo context. '''
         # I think I need to do this to save Cairo some work
         if cr is None:
             cr = self.cr
@@ -144,40 +375,81 @@ class Sprites:
         if cr is None:
             print 'sprites.redraw_sprites: no Cairo context'
             return
+        if self._retained:
+            self._update_backing()
+            cr.set_source_surface(self._backing, 0, 0)
+            cr.paint()
+            return
+        if area is None:
+            x0, y0, x1, y1 = cr.clip_extents()
+        elif hasattr(area, 'width'):  # a Gdk.Rectangle
+            x0, y0 = area.x, area.y
+            x1, y1 = area.x + area.width, area.y + area.height
+        else:
+            x0, y0 = area[0], area[1]
+            x1, y1 = area[0] + area[2], area[1] + area[3]
+        self.sprites_drawn = 0
+        self._draw_area(cr, x0, y0, x1, y1)
+
+    def _draw_area(self, cr, x0, y0, x1, y1):
+        ''' Draw the sprites that intersect (x0, y0)-(x1, y1) '''
         for spr in self.list:
-            if area is None:
+            if spr.rect[0] < x1 and spr.rect[0] + spr.rect[2] > x0 and \
+               spr.rect[1] < y1 and spr.rect[1] + spr.rect[3] > y0:
                 spr.draw(cr=cr)
-            else:
-                intersection = spr.rect.intersect(area)
-                if intersection.width > 0 or intersection.height > 0:
-                    spr.draw(cr=cr)
+                self.sprites_drawn += 1
+
+    def _update_backing(self):
+        ''' Redraw the damaged areas of the offscreen surface '''
+        width = self.widget.get_allocated_width()
+        height = self.widget.get_allocated_height()
+        if self._backing is None or \
+           self._backing.get_width() != width or \
+           self._backing.get_height() != height:
+            self._backing = cairo.ImageSurface(cairo.FORMAT_ARGB32,
+                                               width, height)
+            self._damage = [(0, 0, width, height)]
+        self.sprites_drawn = 0
+        if len(self._damage) == 0:
+            return
+        cr = cairo.Context(self._backing)
+        for x0, y0, x1, y1 in self._damage:
+            cr.save()
+            cr.rectangle(x0, y0, x1 - x0, y1 - y0)
+            cr.clip()
+            cr.set_operator(cairo.OPERATOR_CLEAR)
+            cr.paint()
+            cr.set_operator(cairo.OPERATOR_OVER)
+            self._draw_area(cr, x0, y0, x1, y1)
+            cr.restore()
+        self._damage = []
 
 
-class Sprite:
+class Sprite(object):
     ''' A class for the individual sprites '''
 
+    __slots__ = ('_sprites', 'save_xy', 'rect', '_attributes', '_fd',
+                 '_font', '_layouts', '_color', '_margins', 'layer', '_key',
+                 'labels', 'images', '_dx', '_dy', 'type', 'index')
+
     def __init__(self, sprites, x, y, image):
         ''' Initialize an individual sprite '''
         self._sprites = sprites
         self.save_xy = (x, y)  # remember initial (x, y) position
-        self.rect = [int(x), int(y), 0, 0]
-        self._scale = [12]
-        self._rescale = [True]
-        self._horiz_align = ["center"]
-        self._vert_align = ["middle"]
-        self._x_pos = [None]
-        self._y_pos = [None]
+        self.rect = array('i', [int(x), int(y), 0, 0])
+        self._attributes = DEFAULT_LABEL_ATTRIBUTES  # one tuple per label
         self._fd = None
-        self._bold = False
-        self._italic = False
+        self._font = None
+        self._layouts = None  # cached Pango layouts, by label
         self._color = None
-        self._margins = [0, 0, 0, 0]
+        self._margins = NO_MARGINS
         self.layer = 100
         self.labels = []
         self.images = []
         self._dx = []  # image offsets
         self._dy = []
         self.type = None
+        self.index = None  # free for the application to use
         self.set_image(image)
         self._sprites.append_to_list(self)
 
@@ -203,11 +475,13 @@ class Sprite:
                 self.rect[2] = w + dx
             if h + dy > self.rect[3]:
                 self.rect[3] = h + dy
+        self._sprites.update_index(self)
 
     def move(self, pos):
         ''' Move to new (x, y) position '''
         self.inval()
         self.rect[0], self.rect[1] = int(pos[0]), int(pos[1])
+        self._sprites.update_index(self)
         self.inval()
 
     def move_relative(self, pos):
@@ -215,6 +489,7 @@ class Sprite:
         self.inval()
         self.rect[0] += int(pos[0])
         self.rect[1] += int(pos[1])
+        self._sprites.update_index(self)
         self.inval()
 
     def get_xy(self):
@@ -240,11 +515,6 @@ class Sprite:
         self._sprites.remove_from_list(self)
         if layer is not None:
             self.layer = layer
-        for i in range(self._sprites.length_of_list()):
-            if self.layer < self._sprites.get_sprite(i).layer:
-                self._sprites.insert_in_list(self, i)
-                self.inval()
-                return
         self._sprites.append_to_list(self)
         self.inval()
 
@@ -256,30 +526,35 @@ class Sprite:
             self.labels[i] = new_label.replace("\0", " ")
         else:
             self.labels[i] = str(new_label)
+        if self._layouts is not None:
+            self._layouts.pop(i, None)
         self.inval()
 
     def set_margins(self, l=0, t=0, r=0, b=0):
         ''' Set the margins for drawing the label '''
-        self._margins = [l, t, r, b]
+        self._margins = (l, t, r, b)
+        self._layouts = None
 
     def _extend_labels_array(self, i):
         ''' Append to the labels attribute list '''
         if self._fd is None:
             self.set_font('Sans')
         if self._color is None:
-            self._color = (0., 0., 0.)
+            self._color = BLACK
         while len(self.labels) < i + 1:
             self.labels.append(" ")
-            self._scale.append(self._scale[0])
-            self._rescale.append(self._rescale[0])
-            self._horiz_align.append(self._horiz_align[0])
-            self._vert_align.append(self._vert_align[0])
-            self._x_pos.append(self._x_pos[0])
-            self._y_pos.append(self._y_pos[0])
+        if len(self._attributes) < i + 1:
+            self._attributes = _share(
+                self._attributes
+                + self._attributes[:1] * (i + 1 - len(self._attributes)))
 
     def set_font(self, font):
         ''' Set the font for a label '''
-        self._fd = Pango.FontDescription(font)
+        if font not in _shared_fonts:
+            _shared_fonts[font] = Pango.FontDescription(font)
+        self._fd = _shared_fonts[font]
+        self._font = font
+        self._layouts = None
 
     def set_label_color(self, rgb):
         ''' Set the font color for a label '''
@@ -300,12 +575,12 @@ class Sprite:
                              vert_align="middle", x_pos=None, y_pos=None, i=0):
         ''' Set the various label attributes '''
         self._extend_labels_array(i)
-        self._scale[i] = scale
-        self._rescale[i] = rescale
-        self._horiz_align[i] = horiz_align
-        self._vert_align[i] = vert_align
-        self._x_pos[i] = x_pos
-        self._y_pos[i] = y_pos
+        self._attributes = _share(
+            self._attributes[:i]
+            + ((scale, rescale, horiz_align, vert_align, x_pos, y_pos),)
+            + self._attributes[i + 1:])
+        if self._layouts is not None:
+            self._layouts.pop(i, None)
 
     def hide(self):
         ''' Hide a sprite '''
@@ -318,11 +593,7 @@ class Sprite:
 
     def inval(self):
         ''' Invalidate a region for gtk '''
-        # self._sprites.window.invalidate_rect(self.rect, False)
-        self._sprites.widget.queue_draw_area(self.rect[0],
-                                             self.rect[1],
-                                             self.rect[2],
-                                             self.rect[3])
+        self._sprites.invalidate(self.rect)
 
     def draw(self, cr=None):
         ''' Draw the sprite (and label) '''
@@ -374,40 +645,22 @@ class Sprite:
             my_width = 0
         my_height = self.rect[3] - self._margins[1] - self._margins[3]
         for i in range(len(self.labels)):
-            pl = PangoCairo.create_layout(cr)
-            pl.set_text(str(self.labels[i]), -1)
-            self._fd.set_size(int(self._scale[i] * Pango.SCALE))
-            pl.set_font_description(self._fd)
-            w = pl.get_size()[0] / Pango.SCALE
-            if w > my_width:
-                if self._rescale[i]:
-                    self._fd.set_size(
-                        int(self._scale[i] * Pango.SCALE * my_width / w))
-                    pl.set_font_description(self._fd)
-                    w = pl.get_size()[0] / Pango.SCALE
-                else:
-                    j = len(self.labels[i]) - 1
-                    while(w > my_width and j > 0):
-                        pl.set_text(
-                            "…" + self.labels[i][len(self.labels[i]) - j:], -1)
-                        self._fd.set_size(int(self._scale[i] * Pango.SCALE))
-                        pl.set_font_description(self._fd)
-                        w = pl.get_size()[0] / Pango.SCALE
-                        j -= 1
-            if self._x_pos[i] is not None:
-                x = int(self.rect[0] + self._x_pos[i])
-            elif self._horiz_align[i] == "center":
+            pl, w, h = self._get_layout(cr, i, my_width)
+            scale, rescale, horiz_align, vert_align, x_pos, y_pos = \
+                self._attributes[i]
+            if x_pos is not None:
+                x = int(self.rect[0] + x_pos)
+            elif horiz_align == "center":
                 x = int(self.rect[0] + self._margins[0] + (my_width - w) / 2)
-            elif self._horiz_align[i] == 'left':
+            elif horiz_align == 'left':
                 x = int(self.rect[0] + self._margins[0])
             else:  # right
                 x = int(self.rect[0] + self.rect[2] - w - self._margins[2])
-            h = pl.get_size()[1] / Pango.SCALE
-            if self._y_pos[i] is not None:
-                y = int(self.rect[1] + self._y_pos[i])
-            elif self._vert_align[i] == "middle":
+            if y_pos is not None:
+                y = int(self.rect[1] + y_pos)
+            elif vert_align == "middle":
                 y = int(self.rect[1] + self._margins[1] + (my_height - h) / 2)
-            elif self._vert_align[i] == "top":
+            elif vert_align == "top":
                 y = int(self.rect[1] + self._margins[1])
             else:  # bottom
                 y = int(self.rect[1] + self.rect[3] - h - self._margins[3])
@@ -418,6 +671,40 @@ class Sprite:
             PangoCairo.show_layout(cr, pl)
             cr.restore()
 
+    def _get_layout(self, cr, i, my_width):
+        ''' Return a layout for label i, with its width and height. The
+        text is only laid out again when the label, its attributes or
+        the available width change. '''
+        scale, rescale = self._attributes[i][:2]
+        key = (self.labels[i], scale, rescale, self._font, my_width)
+        if self._layouts is None:
+            self._layouts = {}
+        elif i in self._layouts and self._layouts[i][0] == key:
+            return self._layouts[i][1:]
+        pl = PangoCairo.create_layout(cr)
+        pl.set_text(str(self.labels[i]), -1)
+        self._fd.set_size(int(scale * Pango.SCALE))
+        pl.set_font_description(self._fd)
+        w = pl.get_size()[0] / Pango.SCALE
+        if w > my_width:
+            if rescale:
+                self._fd.set_size(
+                    int(scale * Pango.SCALE * my_width / w))
+                pl.set_font_description(self._fd)
+                w = pl.get_size()[0] / Pango.SCALE
+            else:
+                j = len(self.labels[i]) - 1
+                while(w > my_width and j > 0):
+                    pl.set_text(
+                        "…" + self.labels[i][len(self.labels[i]) - j:], -1)
+                    self._fd.set_size(int(scale * Pango.SCALE))
+                    pl.set_font_description(self._fd)
+                    w = pl.get_size()[0] / Pango.SCALE
+                    j -= 1
+        h = pl.get_size()[1] / Pango.SCALE
+        self._layouts[i] = (key, pl, w, h)
+        return pl, w, h
+
     def label_width(self, cr=None):
         ''' Calculate the width of a label '''
         if cr is None:
@@ -426,7 +713,7 @@ class Sprite:
         for i in range(len(self.labels)):
             pl = PangoCairo.create_layout(cr)
             pl.set_text(str(self.labels[i]), -1)
-            self._fd.set_size(int(self._scale[i] * Pango.SCALE))
+            self._fd.set_size(int(self._attributes[i][0] * Pango.SCALE))
             pl.set_font_description(self._fd)
             w = pl.get_size()[0] / Pango.SCALE
             if w > max:
@@ -446,30 +733,20 @@ class Sprite:
         return(self._margins[0], self._margins[1])
 
     def get_pixel(self, pos, i=0):
-        ''' Return the pixl at (x, y) '''
-        x, y = pos
-        x = x - self.rect[0]
-        y = y - self.rect[1]
-        if y > self.images[i].get_height() - 1:
-            return(-1, -1, -1, -1)
-        if isinstance(self.images[i], cairo.ImageSurface):
-            array = self.images[i].get_data()
-        else:
-            array = self.images[i].get_pixels()
-
-        if array is not None:
-            offset = (y * self.images[i].get_width() + x) * 4
-            if offset < 0 or offset > len(array) - 4:
-                print "Index Error: %d %d" % (len(array), offset)
-                return(-1, -1, -1, -1)
-            else:
-                offset = (y * self.images[i].get_width() + x) * 4
-                r, g, b, a = ord(array[offset]), ord(array[offset + 1]), \
-                    ord(array[offset + 2]), ord(array[offset + 3])
-                if isinstance(self.images[i], cairo.ImageSurface):
-                    return(b, g, r, a)
-                else:
-                    return(r, g, b, a)
-        else:
-            print "Array is none"
+        ''' Return the pixel at (x, y) as (r, g, b, a) '''
+        image = self.images[i]
+        x = int(pos[0]) - self.rect[0] - self._dx[i]
+        y = int(pos[1]) - self.rect[1] - self._dy[i]
+        if x < 0 or y < 0 or \
+           x > image.get_width() - 1 or y > image.get_height() - 1:
             return(-1, -1, -1, -1)
+        if isinstance(image, GdkPixbuf.Pixbuf):
+            # get_pixels copies the pixbuf, so only ask for one pixel
+            image = image.new_subpixbuf(x, y, 1, 1)
+            x, y = 0, 0
+        view, stride, channels, order = _get_pixels(image)
+        offset = y * stride + x * channels
+        pixel = bytearray(view[offset:offset + channels])
+        if channels == 3:
+            pixel.append(255)
+        return tuple([pixel[j] for j in order])
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011-13 Walter Bender
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import unittest
+
+from board import Board, BoardEncoder, PortableRandom, decode_board, \
+    encode_board_code, decode_board_code, REVEALED, HIDDEN, MARKED, \
+    MARKED_COOKIE
+
+
+def played_board(width=10, height=7, seed=1):
+    ''' Return a board with cells in every state '''
+    board = Board(width, height)
+    cookies = board.place_cookies(12, PortableRandom(seed))
+    board.flip(cookies[0])
+    for i in range(board.size):
+        if not board.is_cookie(i):
+            board.reveal(i)
+            break
+    for i in range(board.size - 1, -1, -1):
+        if board.get(i) == HIDDEN:
+            board.flip(i)
+            break
+    return board
+
+
+class BoardEncoderTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        board = played_board()
+        self.assertTrue(MARKED_COOKIE in board.save())
+        self.assertTrue(MARKED in board.save())
+        width, height, level, states = decode_board(
+            BoardEncoder().encode(board, 3))
+        self.assertEqual((width, height, level), (10, 7, 3))
+        self.assertEqual(states, board.save())
+
+    def test_odd_size(self):
+        board = played_board(7, 3)
+        width, height, level, states = decode_board(
+            BoardEncoder().encode(board, 1))
+        self.assertEqual((width, height), (7, 3))
+        self.assertEqual(states, board.save())
+
+    def test_incremental(self):
+        board = played_board()
+        encoder = BoardEncoder()
+        text = encoder.encode(board, 1)
+        self.assertFalse(board.has_changes())
+        self.assertEqual(encoder.encode(board, 1), text)
+
+        for i in range(board.size):
+            if not board.is_cookie(i) and board.get(i) != REVEALED:
+                board.reveal(i)
+        board.flip(board.size - 1)
+        self.assertTrue(board.has_changes())
+        text = encoder.encode(board, 2)
+        self.assertEqual(text, BoardEncoder().encode(board, 2))
+        self.assertEqual(decode_board(text), (10, 7, 2, board.save()))
+
+        # A new board is packed in full
+        other = played_board(seed=2)
+        text = encoder.encode(other, 2)
+        self.assertEqual(decode_board(text), (10, 7, 2, other.save()))
+
+    def test_bad_text(self):
+        text = BoardEncoder().encode(played_board(), 1)
+        for bad in ['', 'not a board', text[:-4]]:
+            self.assertRaises(ValueError, decode_board, bad)
+
+
+class BoardCodeTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for args in [(0, 10, 7, 1, False), (0xFFFFFFFF, 200, 200, 69, True),
+                     (12345, 7, 10, 2, False)]:
+            code = encode_board_code(*args)
+            seed, width, height, level, no_guess = decode_board_code(code)
+            self.assertEqual((seed, level, no_guess),
+                             (args[0], args[3], args[4]))
+            self.assertEqual((width, height),
+                             (max(args[1:3]), min(args[1:3])))
+
+    def test_bad_code(self):
+        for code in ['', '1-10x7', '1-10x7-0', 'U-10x7-1', '1-10-1',
+                     '10000000-10x7-1']:
+            self.assertRaises(ValueError, decode_board_code, code)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011-13 Walter Bender
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import unittest
+
+import protocol
+from protocol import JsonCodec, BinaryCodec
+
+# The cells on the largest board
+CELLS = 200 * 200
+
+# (command, payload) for each kind of event
+EVENTS = [
+    ('c', '3NQK8N-10x7-2'),
+    ('c', '0-200x200-69-N'),
+    ('p', [12, 3]),
+    ('p', [39999, 0]),
+    ('r', [4]),
+    ('r', [0, 1, 2, 3, 10, 11, 12, 200, 39999]),
+    ('r', []),
+]
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_json(self):
+        codec = JsonCodec()
+        for command, payload in EVENTS:
+            text = codec.encode(command, payload, 7)
+            self.assertEqual(codec.decode(text, CELLS),
+                             (command, payload, None))
+            self.assertEqual(protocol.decode(text, CELLS),
+                             (command, payload, None))
+
+    def test_binary(self):
+        codec = BinaryCodec()
+        for sequence, (command, payload) in enumerate(EVENTS):
+            sequence *= 1000  # varints of one, two and three bytes
+            text = codec.encode(command, payload, sequence)
+            self.assertTrue(text.startswith(protocol.BINARY_PREFIX))
+            self.assertEqual(codec.decode(text, CELLS),
+                             (command, payload, sequence))
+            self.assertEqual(protocol.decode(text, CELLS),
+                             (command, payload, sequence))
+
+    def test_reveal_order(self):
+        # Revealed cells come back sorted, once each
+        text = BinaryCodec().encode('r', [9, 3, 4, 3, 8], 1)
+        self.assertEqual(protocol.decode(text, CELLS), ('r', [3, 4, 8, 9], 1))
+
+    def test_legacy_board(self):
+        # Older versions send a whole board as 'n'
+        dots = [1, 1, 2, 0, 3]
+        self.assertEqual(protocol.decode('n|[1, 1, 2, 0, 3]', CELLS),
+                         ('n', dots, None))
+        text = BinaryCodec().encode('n', dots, 2)
+        self.assertEqual(protocol.decode(text, CELLS), ('n', dots, 2))
+
+    def test_bad_messages(self):
+        good = BinaryCodec().encode('p', [1, 2], 5)
+        for text in ['no separator', '#', '#!!!!', good[:-4],
+                     '#' + 'AmM=',  # version 2
+                     '#' + 'AXg=',  # unknown command x
+                     '#AXIBAQCAgICAgCA=']:  # a run of 2**40 cells
+            self.assertRaises(ValueError, protocol.decode, text, CELLS)
+
+    def test_too_many_cells(self):
+        # One run of 2**40 cells
+        self.assertRaises(ValueError, protocol.decode, '#AXIBAQCAgICAgCA=',
+                          CELLS)
+        text = BinaryCodec().encode('r', [0, 1, 69], 1)
+        self.assertEqual(protocol.decode(text, 70), ('r', [0, 1, 69], 1))
+        self.assertRaises(ValueError, protocol.decode, text, 69)
+        text = BinaryCodec().encode('r', list(range(0, 140, 2)), 1)
+        self.assertRaises(ValueError, protocol.decode, text, 69)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011-13 Walter Bender
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import json
+import unittest
+
+from scores import ScoreStore, csv_lines, json_lines, FIELDS, WON, LOST
+
+
+def played_store(max_history=10):
+    ''' Return a store with a few games won and lost '''
+    store = ScoreStore(max_history)
+    store.add(30, 1, 10, 7, WON, timestamp=100)
+    store.add(12, 1, 10, 7, LOST, timestamp=200)
+    store.add(50, 2, 10, 7, WON, timestamp=300)
+    store.add(20, 2, 20, 14, WON, timestamp=400)
+    return store
+
+
+class ScoreStoreTest(unittest.TestCase):
+
+    def test_totals(self):
+        store = played_store()
+        self.assertTrue(store.dirty)
+        self.assertEqual(len(store), 4)
+        self.assertEqual((store.games, store.wins, store.best), (4, 3, 20))
+        self.assertEqual(store.mean(), 100 / 3.)
+        self.assertEqual(store.histogram(), [(1, 1, 1), (2, 2, 0)])
+        self.assertEqual(store.wins_history(), [30, 50, 20])
+
+    def test_empty(self):
+        store = ScoreStore()
+        self.assertFalse(store.dirty)
+        self.assertEqual(store.mean(), None)
+        self.assertEqual(store.best, None)
+        self.assertEqual(store.histogram(), [])
+
+    def test_history_limit(self):
+        store = ScoreStore(max_history=3)
+        for duration in range(1, 11):
+            store.add(duration, 1, 10, 7, WON)
+        self.assertEqual(store.wins_history(), [8, 9, 10])
+        # The totals still count every game
+        self.assertEqual((store.games, store.wins, store.best), (10, 10, 1))
+        self.assertEqual(store.mean(), 5.5)
+
+    def test_round_trip(self):
+        store = played_store()
+        # As it is saved in the Journal
+        data = json.loads(json.dumps(store.dump()))
+        loaded = ScoreStore(10)
+        loaded.load(data)
+        self.assertFalse(loaded.dirty)
+        self.assertEqual(loaded.history, store.history)
+        self.assertEqual((loaded.games, loaded.wins, loaded.best),
+                         (store.games, store.wins, store.best))
+        self.assertEqual(loaded.mean(), store.mean())
+        self.assertEqual(loaded.histogram(), store.histogram())
+
+    def test_load_limit(self):
+        loaded = ScoreStore(max_history=2)
+        loaded.load(played_store().dump())
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded.games, 4)
+
+    def test_legacy(self):
+        # Older versions saved the time of each win as [h:]mm:ss
+        store = ScoreStore(max_history=2)
+        store.load(['00:30', '01:05', '1:00:00'])
+        self.assertTrue(store.dirty)
+        self.assertEqual(store.wins_history(), [65, 3600])
+        self.assertEqual((store.games, store.wins, store.best), (3, 3, 30))
+        self.assertEqual(store.histogram(), [])
+
+    def test_bad_stores(self):
+        good = played_store().dump()
+        newer = dict(good)
+        newer['version'] = 2
+        missing = dict(good)
+        del missing['levels']
+        for data in [['00:30', 'soon'], [30], {}, newer, missing, 'scores']:
+            self.assertRaises(ValueError, ScoreStore().load, data)
+
+
+class ExportTest(unittest.TestCase):
+
+    def test_csv(self):
+        lines = list(csv_lines(played_store()))
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[0], ','.join(FIELDS) + '\n')
+        self.assertEqual(lines[2], '12,1,10,7,lost,200\n')
+
+    def test_csv_legacy(self):
+        # Games loaded from older versions only have a duration
+        store = ScoreStore()
+        store.load(['00:30'])
+        self.assertEqual(list(csv_lines(store))[1], '30,,,,won,\n')
+
+    def test_json(self):
+        store = played_store()
+        lines = list(json_lines(store))
+        self.assertEqual(len(lines), 4)
+        for line, game in zip(lines, store.history):
+            self.assertTrue(line.endswith('\n'))
+            self.assertEqual(json.loads(line), dict(zip(FIELDS, game)))
+
+    def test_empty(self):
+        self.assertEqual(list(csv_lines(ScoreStore())),
+                         [','.join(FIELDS) + '\n'])
+        self.assertEqual(list(json_lines(ScoreStore())), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
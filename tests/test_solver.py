@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2011-13 Walter Bender
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, write to the Free Software
+# Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
+
+import unittest
+
+from board import Board, PortableRandom, COOKIE
+from solver import Solver, no_guess_board, no_guess_start, \
+    max_no_guess_cookies
+
+
+def make_board(width, height, cookies):
+    ''' Return a board with cookies at a list of (column, row) '''
+    board = Board(width, height)
+    for pos in cookies:
+        board.set(board.grid_to_dot(pos), COOKIE)
+    return board
+
+
+class SolverTest(unittest.TestCase):
+
+    def solve(self, width, height, cookies, start=(0, 0)):
+        board = make_board(width, height, cookies)
+        return Solver(board).solve(board.grid_to_dot(start))
+
+    def test_empty_board(self):
+        self.assertTrue(self.solve(5, 4, []))
+
+    def test_counts(self):
+        # The numbers along the third row (1 1 2 1 1) place both
+        # cookies in the hidden bottom row
+        self.assertTrue(self.solve(5, 4, [(1, 3), (3, 3)]))
+        self.assertTrue(self.solve(5, 4, [(1, 3), (2, 3)]))
+
+    def test_total(self):
+        # The last two hidden cells must both be cookies
+        self.assertTrue(self.solve(4, 2, [(3, 0), (3, 1)]))
+
+    def test_guess(self):
+        # One cookie in the last column, and nothing tells which cell
+        self.assertFalse(self.solve(4, 2, [(3, 0)]))
+        self.assertFalse(self.solve(4, 2, [(3, 1)]))
+
+    def test_start_on_cookie(self):
+        self.assertFalse(self.solve(4, 2, [(0, 0)]))
+
+
+class NoGuessBoardTest(unittest.TestCase):
+
+    def test_solvable(self):
+        width, height = 10, 7
+        start = no_guess_start(width, height)
+        for seed in range(20):
+            board, solved = no_guess_board(width, height, 10,
+                                           PortableRandom(seed), start)
+            self.assertTrue(solved)
+            self.assertEqual(board.totals[COOKIE], 10)
+            self.assertFalse(board.is_cookie(start))
+            for i in board.neighbors(start):
+                self.assertFalse(board.is_cookie(i))
+            self.assertTrue(Solver(board).solve(start))
+
+    def test_same_seed(self):
+        start = no_guess_start(10, 7)
+        first, solved = no_guess_board(10, 7, 20, PortableRandom(3), start)
+        again, solved = no_guess_board(10, 7, 20, PortableRandom(3), start)
+        self.assertEqual(first.save(), again.save())
+
+    def test_no_attempts(self):
+        # A board with all its cookies is returned even if none of the
+        # boards tried can be solved
+        start = no_guess_start(10, 7)
+        board, solved = no_guess_board(10, 7, 20, PortableRandom(3), start,
+                                       attempts=0)
+        self.assertFalse(solved)
+        self.assertEqual(board.totals[COOKIE], 20)
+        self.assertFalse(board.is_cookie(start))
+
+    def test_max_cookies(self):
+        self.assertEqual(max_no_guess_cookies(10, 7), 60)
+        width, height = 10, 7
+        number = max_no_guess_cookies(width, height)
+        board, solved = no_guess_board(width, height, number,
+                                       PortableRandom(1),
+                                       no_guess_start(width, height))
+        self.assertEqual(board.totals[COOKIE], number)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,7 @@
 # Foundation, 51 Franklin Street, Suite 500 Boston, MA 02110-1335 USA
 
 
+import time
 from StringIO import StringIO
 try:
     OLD_SUGAR_SYSTEM = False
@@ -25,6 +26,11 @@ except (ImportError, AttributeError):
     except:
         OLD_SUGAR_SYSTEM = True
 
+import logging
+_logger = logging.getLogger('cookie-search-activity')
+
+_timing_hooks = []
+
 
 def json_load(text):
     """ Load JSON data using what ever resources are available. """
@@ -60,3 +66,26 @@ def convert_seconds_to_minutes(seconds):
         return "%d:%02d:%02d" % (hours, minutes, seconds)
     else:
         return "%02d:%02d" % (minutes, seconds)
+
+
+def add_timing_hook(hook):
+    """ Call hook(phase, seconds, total_seconds) as each phase ends. """
+    _timing_hooks.append(hook)
+
+
+class PhaseTimer():
+    """ Measure how long each phase of startup takes. """
+
+    def __init__(self):
+        self._start = self._last = time.time()
+        self.phases = []
+
+    def mark(self, phase):
+        """ End a phase and pass its duration to the timing hooks. """
+        now = time.time()
+        self.phases.append((phase, now - self._last))
+        _logger.debug('%s: %.3fs (%.3fs since start)' % (
+            phase, now - self._last, now - self._start))
+        for hook in _timing_hooks:
+            hook(phase, now - self._last, now - self._start)
+        self._last = now